@@ -0,0 +1,148 @@
+from itertools import groupby
+from typing import Optional
+
+from models import BibleBatch
+
+
+class CommentaryAggregator:
+    """Agrupa os comentários de uma bíblia de estudos antes da gravação.
+
+    Versículos consecutivos de um mesmo capítulo com o mesmo comentário
+    convertido viram um único registro de VerseCommentary com o intervalo de
+    versículos. Um comentário presente em todos os versículos de um capítulo é
+    gravado em ChapterCommentary e, se for o mesmo em todos os capítulos de um
+    livro, em BookCommentary.
+
+    Os lotes devem chegar na ordem da tabela Bible (livro, capítulo e
+    versículo); um capítulo só é gravado quando o seguinte começa (ou em `finish`).
+    """
+
+    def __init__(self, promote_books: bool = True) -> None:
+        """
+        Args:
+            promote_books (bool): Se os comentários podem ser promovidos a
+            comentários do livro (desligado no modo incremental, em que os
+            capítulos são atualizados um a um)
+        """
+
+        self.promote_books = promote_books
+
+        self.book_rows: list[tuple] = []
+        self.chapter_rows: list[tuple] = []
+        self.verse_rows: list[tuple] = []
+        """Registros prontos para gravação (ver `drain`)"""
+
+        self.chapter: Optional[tuple[int, int]] = None
+        self.chapter_verses = 0
+        self.chapter_comments: list[tuple[int, str]] = []
+        """Versículos do capítulo atual e os seus comentários (versículo, texto)"""
+
+        self.book_chapters: list[tuple[int, int, str]] = []
+        self.book_covered = True
+        """Capítulos do livro atual promovidos e se todos os capítulos até aqui foram promovidos"""
+
+        self.source_rows = 0
+        """Quantidade de comentários recebidos"""
+
+    def add(self, verses: BibleBatch, commentaries: BibleBatch) -> None:
+        """Acrescenta um lote convertido
+
+        Args:
+            verses (BibleBatch): Todos os versículos do lote (definem o tamanho dos capítulos)
+            commentaries (BibleBatch): Os comentários dos versículos do mesmo lote
+        """
+
+        self.source_rows += len(commentaries)
+
+        comments = iter(commentaries)
+        comment = next(comments, None)
+
+        for key, group in groupby(verses.chapter_keys()):
+            if key != self.chapter:
+                self.start_chapter(key)
+
+            self.chapter_verses += sum(1 for _ in group)
+
+            while comment is not None and (comment[0], comment[1]) == key:
+                self.chapter_comments.append((comment[2], comment[3]))
+                comment = next(comments, None)
+
+    def start_chapter(self, key: tuple[int, int]) -> None:
+        """Fecha o capítulo atual (e o livro, se ele mudou) e começa o próximo"""
+
+        if self.chapter is not None:
+            self.finish_chapter()
+
+            if key[0] != self.chapter[0]:
+                self.finish_book()
+
+        self.chapter = key
+        self.chapter_verses = 0
+        self.chapter_comments = []
+
+    def finish_chapter(self) -> None:
+        """Agrupa os comentários do capítulo atual em intervalos de versículos"""
+
+        book, chapter = self.chapter
+
+        if not self.chapter_comments:
+            self.abandon_book()
+            return
+
+        ranges: list[list] = []
+
+        for verse, text in self.chapter_comments:
+            if ranges and ranges[-1][2] == text and verse <= ranges[-1][1] + 1:
+                ranges[-1][1] = max(ranges[-1][1], verse)
+            else:
+                ranges.append([verse, verse, text])
+
+        if len(ranges) == 1 and len(self.chapter_comments) == self.chapter_verses:
+            self.book_chapters.append((book, chapter, ranges[0][2]))
+            return
+
+        self.abandon_book()
+        self.verse_rows.extend((book, chapter, first, chapter, last, text)
+                               for first, last, text in ranges)
+
+    def abandon_book(self) -> None:
+        """O livro atual não pode mais ser promovido: grava os capítulos pendentes"""
+
+        self.book_covered = False
+        self.chapter_rows.extend(self.book_chapters)
+        self.book_chapters = []
+
+    def finish_book(self) -> None:
+        """Promove os comentários do livro atual, se todos os capítulos tiverem o mesmo"""
+
+        texts = {text for _, _, text in self.book_chapters}
+
+        if self.promote_books and self.book_covered and len(texts) == 1:
+            self.book_rows.append((self.book_chapters[0][0], texts.pop()))
+        else:
+            self.chapter_rows.extend(self.book_chapters)
+
+        self.book_chapters = []
+        self.book_covered = True
+
+    def finish(self) -> None:
+        """Fecha o último capítulo e o último livro (ao final da conversão)"""
+
+        if self.chapter is not None:
+            self.finish_chapter()
+            self.finish_book()
+
+        self.chapter = None
+
+    def drain(self) -> tuple[list[tuple], list[tuple], list[tuple]]:
+        """Retorna e esvazia os registros prontos para gravação
+
+        Returns:
+            tuple[list[tuple], list[tuple], list[tuple]]: Os registros de
+            BookCommentary, ChapterCommentary e VerseCommentary
+        """
+
+        rows = (self.book_rows, self.chapter_rows, self.verse_rows)
+        self.book_rows, self.chapter_rows, self.verse_rows = [], [], []
+
+        return rows
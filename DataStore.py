@@ -0,0 +1,86 @@
+import re
+import base64
+import binascii
+import hashlib
+
+from Database import BulkWriter
+
+
+_DATA_URI_PATTERN = re.compile(
+    r'''(<img\b[^>]*?\bsrc=)(["'])data:image/([\w.+-]+);base64,([A-Za-z0-9+/=\s]+)\2''', re.IGNORECASE)
+
+
+class DataStore:
+    """Grava uma única vez na tabela `data` do módulo e-Sword HD as imagens
+    embutidas nos comentários (URIs data:image/...;base64).
+
+    Cada imagem é identificada pelo resumo SHA-256 do seu conteúdo: no
+    comentário a URI é trocada pelo identificador, e imagens repetidas em
+    vários comentários são gravadas somente na primeira vez.
+    """
+
+    def __init__(self, writer: BulkWriter) -> None:
+        """
+        Args:
+            writer (BulkWriter): Responsável pela gravação do banco de comentários
+            (que deve ter a tabela `data`)
+        """
+
+        self.writer = writer
+        self.stored: set[str] = set()
+        self.pending: list[tuple[str, str, bytes]] = []
+
+        self.references = 0
+        """Quantidade de imagens encontradas nos comentários"""
+        self.saved_bytes = 0
+        """Bytes (das URIs) que deixaram de ser gravados nos comentários"""
+
+    def replace_images(self, text: str) -> str:
+        """Troca as imagens embutidas no comentário pelos seus identificadores
+        na tabela `data`, guardando as novas para gravação
+
+        Args:
+            text (str): HTML do comentário já convertido
+
+        Returns:
+            str: O comentário com as imagens substituídas
+        """
+
+        if 'base64,' not in text:
+            return text
+
+        return _DATA_URI_PATTERN.sub(self._replace_image, text)
+
+    def _replace_image(self, match: re.Match) -> str:
+        try:
+            content = base64.b64decode(re.sub(r'\s', '', match.group(4)), validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+
+        identifier = f"{hashlib.sha256(content).hexdigest()}.{match.group(3).lower().split('+')[0]}"
+
+        if identifier not in self.stored:
+            self.stored.add(identifier)
+            self.pending.append((identifier, identifier, content))
+
+        self.references += 1
+        self.saved_bytes += len(match.group(0)) - len(match.group(1)) - len(identifier) - 2
+
+        return f'{match.group(1)}{match.group(2)}{identifier}{match.group(2)}'
+
+    def print_statistics(self) -> None:
+        """Exibe quantas imagens foram encontradas e quantas foram gravadas"""
+
+        if self.references:
+            print(f"{self.references} imagem(ns) nos comentários, {len(self.stored)} gravada(s) na tabela data "
+                  f"({self.saved_bytes} bytes a menos nos comentários).")
+
+    def flush(self) -> None:
+        """Grava na tabela `data` as imagens guardadas"""
+
+        if not self.pending:
+            return
+
+        # Num módulo existente (modo incremental) a imagem pode já estar gravada
+        self.writer.insert("INSERT OR IGNORE INTO data (id, filename, content) VALUES (?, ?, ?)", self.pending)
+        self.pending = []
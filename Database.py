@@ -1,4 +1,15 @@
+import os
 import sqlite3
+from contextlib import closing
+from typing import Iterable, Optional
+
+
+OUTPUT_TARGETS: tuple[str, ...] = ("temp", "memory", "direct")
+"""Onde os módulos de saída são montados: num arquivo temporário local, na memória
+ou diretamente no caminho final"""
+
+PAGE_SIZES: tuple[int, ...] = (512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+"""Tamanhos de página aceitos pelo SQLite"""
 
 
 class Database:
@@ -7,10 +18,16 @@ class Database:
     def __init__(self, database_path: str) -> None:
         self.database_path = database_path
 
-    def connect(self) -> None:
-        """Conecta ao banco de dados"""
+    def connect(self) -> sqlite3.Connection:
+        """Conecta ao banco de dados
+
+        Returns:
+            sqlite3.Connection: O objeto de conexão aberto
+        """
 
         self.connection: sqlite3.Connection = sqlite3.connect(self.database_path)
+
+        return self.connection
     
 
     def execute(self, sql: str) -> sqlite3.Cursor:
@@ -25,8 +42,13 @@ class Database:
 
       return self.connection.execute(sql)
 
-    def create_commentary_tables(self) -> None:
-      """Configura o banco de dados de saída dos comentários"""
+    def create_commentary_tables(self, writer: Optional['BulkWriter'] = None) -> None:
+      """Configura o banco de dados de saída dos comentários
+
+      Args:
+          writer (Optional[BulkWriter]): Se informado, os índices só serão criados
+          quando a gravação em massa terminar
+      """
 
       cursor: sqlite3.Cursor = self.connection.cursor()
 
@@ -37,14 +59,22 @@ class Database:
       CREATE TABLE VerseCommentary (Book INT, ChapterBegin INT, VerseBegin INT, ChapterEnd INT, VerseEnd INT, Comments TEXT);
       CREATE TABLE data(rowid INTEGER primary key autoincrement, id TEXT collate nocase, filename TEXT, content BLOB);
       CREATE TABLE Details (Title NVARCHAR(255), Abbreviation NVARCHAR(50), Information TEXT, Version INT, customcss TEXT);
-
-      --Criação dos índices
-      CREATE INDEX BookChapterIndex ON ChapterCommentary (Book, Chapter);
-      CREATE INDEX BookChapterVerseIndex ON VerseCommentary (Book, ChapterBegin, VerseBegin);
-      CREATE INDEX BookIndex ON BookCommentary (Book);
-      CREATE UNIQUE INDEX idx_data_id on data(id);
       """)
 
+      #Criação dos índices
+      indexes = [
+          "CREATE INDEX BookChapterIndex ON ChapterCommentary (Book, Chapter)",
+          "CREATE INDEX BookChapterVerseIndex ON VerseCommentary (Book, ChapterBegin, VerseBegin)",
+          "CREATE INDEX BookIndex ON BookCommentary (Book)",
+          "CREATE UNIQUE INDEX idx_data_id on data(id)",
+      ]
+
+      for sql in indexes:
+          if writer is None:
+              cursor.execute(sql)
+          else:
+              writer.defer_index(sql)
+
       cursor.close()
 
 
@@ -87,3 +117,459 @@ class Database:
 
       input_cursor.close()
       output_cursor.close()
+
+
+class SourceDatabase(Database):
+    """Banco de dados de origem (módulo MySword), aberto somente para leitura.
+
+    O arquivo é aberto como imutável (sem travas e sem verificações de
+    alteração) e lido por memória mapeada, então vários processos podem ler
+    o mesmo módulo ao mesmo tempo compartilhando o cache de páginas do sistema.
+    """
+
+    def __init__(self, database_path: str, cache_size: int = 64 * 1024) -> None:
+        """
+        Args:
+            database_path (str): Caminho do módulo MySword
+            cache_size (int): Tamanho do cache de páginas do SQLite, em KiB
+        """
+
+        super().__init__(database_path)
+        self.cache_size = cache_size
+
+    def connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """Conecta ao banco de dados somente para leitura
+
+        Args:
+            check_same_thread (bool): Se a conexão só pode ser usada pela thread que
+            a abriu (desligado quando a leitura é feita numa thread separada)
+
+        Returns:
+            sqlite3.Connection: O objeto de conexão aberto
+        """
+
+        if not os.path.isfile(self.database_path):
+            raise FileNotFoundError(self.database_path)
+
+        self.connection: sqlite3.Connection = sqlite3.connect(self.uri(self.database_path), uri=True,
+                                                              check_same_thread=check_same_thread)
+        self.connection.execute(f"PRAGMA mmap_size = {os.path.getsize(self.database_path)}")
+        self.connection.execute(f"PRAGMA cache_size = {-self.cache_size}")
+
+        return self.connection
+
+    @staticmethod
+    def uri(database_path: str) -> str:
+        """Retorna a URI que abre o módulo somente para leitura, como imutável
+
+        Args:
+            database_path (str): Caminho do módulo MySword
+
+        Returns:
+            str: A URI (file:...?mode=ro&immutable=1)
+        """
+
+        from pathlib import Path
+
+        return Path(database_path).resolve().as_uri() + "?mode=ro&immutable=1"
+
+
+SCAN_PLANS: tuple[str, ...] = ("index", "rowid", "keys", "sort")
+"""Como a tabela Bible é lida em ordem (ver BibleScan)"""
+
+
+def _sort_key(value: object) -> tuple:
+    """Chave de ordenação do Python equivalente à do SQLite (NULL, números, textos e blobs)"""
+
+    if value is None:
+        return (0,)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+class BibleScan:
+    """Leitura da tabela Bible de um módulo MySword na ordem Book, Chapter,
+    Verse e Scripture sem que o SQLite ordene os textos.
+
+    Com ORDER BY Book, Chapter, Verse, Scripture e sem um índice adequado, o
+    SQLite monta uma árvore temporária com todos os textos, o que nos módulos
+    grandes gera muita gravação em arquivos temporários. Então a ordem de
+    leitura é escolhida assim (ver SCAN_PLANS):
+
+    - "index": um índice começa por (Book, Chapter, Verse); a tabela é lida pelo
+      índice e o SQLite só ordena os versículos repetidos;
+    - "rowid": os registros já foram gravados em ordem e sem versículos
+      repetidos; a tabela é lida na ordem do rowid;
+    - "keys": somente as chaves (inteiras) são ordenadas, no Python, e os textos
+      são lidos pelo rowid; Scripture só desempata os versículos repetidos;
+    - "sort": a consulta original (tabela sem rowid ou chaves que não são inteiras).
+    """
+
+    ORDER_TABLE = "bible_scan_order"
+    """Tabela temporária com os rowids ordenados (somente no plano "keys")"""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        """Escolhe a ordem de leitura, lendo as chaves da tabela quando não houver índice
+
+        Args:
+            connection (sqlite3.Connection): Conexão com o módulo de origem
+        """
+
+        self.index: Optional[str] = self.find_index(connection)
+        self.rowids: Optional[list[int]] = None
+        """Os rowids na ordem da leitura (somente no plano "keys")"""
+
+        if self.index is not None:
+            self.plan = "index"
+        else:
+            self.plan = self.sort_keys(connection)
+
+    @staticmethod
+    def find_index(connection: sqlite3.Connection) -> Optional[str]:
+        """Procura um índice (completo e crescente) que comece por Book, Chapter e Verse
+
+        Args:
+            connection (sqlite3.Connection): Conexão com o módulo de origem
+
+        Returns:
+            Optional[str]: O nome do índice ou None se não houver
+        """
+
+        for _, name, _, _, partial in connection.execute("PRAGMA index_list(Bible)").fetchall():
+            if partial:
+                continue
+
+            # As colunas da chave, na ordem do índice: a primeira decrescente ou diferente
+            # encerra o prefixo, já que as colunas seguintes não dão mais a ordem da leitura
+            columns: list[str] = []
+
+            for _, _, column, descending, _, key in connection.execute(f'PRAGMA index_xinfo("{name}")').fetchall():
+                if not key or descending or len(columns) == 3:
+                    break
+
+                columns.append((column or "").lower())
+
+            if columns == ["book", "chapter", "verse"]:
+                return name
+
+        return None
+
+    def sort_keys(self, connection: sqlite3.Connection) -> str:
+        """Lê as chaves na ordem do rowid e as ordena, se ainda não estiverem ordenadas
+
+        Args:
+            connection (sqlite3.Connection): Conexão com o módulo de origem
+
+        Returns:
+            str: O plano de leitura ("rowid", "keys" ou "sort")
+        """
+
+        try:
+            keys = connection.execute("SELECT Book, Chapter, Verse, rowid FROM Bible ORDER BY rowid").fetchall()
+        except sqlite3.OperationalError:
+            # Tabela WITHOUT ROWID
+            return "sort"
+
+        if not all(type(book) is int and type(chapter) is int and type(verse) is int
+                   for book, chapter, verse, _ in keys):
+            return "sort"
+
+        if all(keys[i][:3] < keys[i + 1][:3] for i in range(len(keys) - 1)):
+            return "rowid"
+
+        keys.sort(key=lambda key: key[:3])
+        self.rowids = [key[3] for key in keys]
+
+        # Versículos repetidos: desempata pelo texto, como o ORDER BY ... Scripture
+        start = 0
+
+        while start < len(keys):
+            end = start + 1
+
+            while end < len(keys) and keys[end][:3] == keys[start][:3]:
+                end += 1
+
+            if end - start > 1:
+                group = self.rowids[start:end]
+                texts = dict(connection.execute(
+                    f"SELECT rowid, Scripture FROM Bible WHERE rowid IN ({', '.join('?' * len(group))})", group))
+                self.rowids[start:end] = sorted(group, key=lambda rowid: _sort_key(texts[rowid]))
+
+            start = end
+
+        return "keys"
+
+    def prepare(self, connection: sqlite3.Connection) -> None:
+        """Grava os rowids ordenados numa tabela temporária da conexão que fará a
+        leitura (somente no plano "keys")
+
+        Args:
+            connection (sqlite3.Connection): A conexão onde a consulta será executada
+        """
+
+        if self.plan != "keys":
+            return
+
+        connection.execute(f"DROP TABLE IF EXISTS temp.{self.ORDER_TABLE}")
+        connection.execute(f"CREATE TEMP TABLE {self.ORDER_TABLE} (Position INTEGER PRIMARY KEY, Id INT)")
+        connection.executemany(f"INSERT INTO temp.{self.ORDER_TABLE} (Id) VALUES (?)",
+                               ((rowid,) for rowid in self.rowids))
+
+    def query(self, columns: str = "Book, Chapter, Verse, Scripture", schema: str = "main",
+              where: Optional[str] = None) -> str:
+        """Monta a consulta que lê a tabela Bible na ordem escolhida
+
+        Args:
+            columns (str): Colunas (ou expressões) selecionadas
+            schema (str): Nome do banco de origem na conexão (ex.: o banco anexado)
+            where (Optional[str]): Condição dos registros lidos
+
+        Returns:
+            str: A instrução SELECT
+        """
+
+        condition = f" WHERE {where}" if where else ""
+
+        if self.plan == "keys":
+            return (f"SELECT {columns} FROM temp.{self.ORDER_TABLE} AS scan_order "
+                    f"CROSS JOIN {schema}.Bible ON {schema}.Bible.rowid = scan_order.Id"
+                    f"{condition} ORDER BY scan_order.Position")
+
+        if self.plan == "rowid":
+            return f"SELECT {columns} FROM {schema}.Bible{condition} ORDER BY rowid"
+
+        indexed = f' INDEXED BY "{self.index}"' if self.plan == "index" else ""
+
+        return (f"SELECT {columns} FROM {schema}.Bible{indexed}{condition} "
+                f"ORDER BY Book, Chapter, Verse, Scripture")
+
+
+class OutputDatabase(Database):
+    """Banco de dados de saída (módulo e-Sword HD), montado longe do caminho final.
+
+    Com o destino "temp" o banco é montado num arquivo do diretório temporário
+    local e com "memory" na memória; ao final ele é copiado de uma só vez, em
+    gravação sequencial, para um arquivo ao lado do caminho final, que então é
+    renomeado atomicamente. Assim uma conversão interrompida nunca deixa um
+    módulo pela metade e o diretório de saída (que pode estar na rede) só recebe
+    uma gravação por módulo. Com "direct" o banco é gravado no próprio caminho final.
+    """
+
+    def __init__(self, database_path: str, target: str = "temp", temp_directory: Optional[str] = None,
+                 page_size: Optional[int] = None) -> None:
+        """
+        Args:
+            database_path (str): Caminho final do módulo
+            target (str): Onde o banco é montado (um dos OUTPUT_TARGETS)
+            temp_directory (Optional[str]): Diretório dos arquivos temporários
+            (por padrão o diretório temporário do sistema)
+            page_size (Optional[int]): Tamanho de página de um banco novo (um dos
+            PAGE_SIZES; por padrão o do SQLite)
+        """
+
+        if target not in OUTPUT_TARGETS:
+            raise ValueError(f"Destino de montagem desconhecido: {target}")
+
+        if page_size is not None and page_size not in PAGE_SIZES:
+            raise ValueError(f"Tamanho de página inválido: {page_size}")
+
+        super().__init__(database_path)
+        self.target = target
+        self.temp_directory = temp_directory
+        self.page_size = page_size
+        self.build_path: Optional[str] = None
+
+    @property
+    def in_place(self) -> bool:
+        """Se o banco é gravado diretamente no caminho final"""
+        return self.target == "direct"
+
+    def connect(self, existing: bool = False) -> sqlite3.Connection:
+        """Abre o banco onde o módulo será montado
+
+        Args:
+            existing (bool): Se o módulo já existente no caminho final deve ser
+            copiado para o banco de montagem (atualização de um módulo)
+
+        Returns:
+            sqlite3.Connection: O objeto de conexão aberto
+        """
+
+        # As conexões aceitam URIs para que o módulo de origem possa ser anexado (ver attach_source)
+        # e podem ser usadas pela thread de gravação (ver Pipeline.WriterThread), uma thread de cada vez
+        if self.in_place:
+            self.connection: sqlite3.Connection = sqlite3.connect(self.database_path, uri=True,
+                                                                  check_same_thread=False)
+
+            if not existing:
+                self.set_page_size()
+            return self.connection
+
+        if self.target == "memory":
+            self.connection = sqlite3.connect(":memory:", uri=True, check_same_thread=False)
+        else:
+            import tempfile
+
+            descriptor, self.build_path = tempfile.mkstemp(
+                suffix=".sqlite", dir=self.temp_directory)
+            os.close(descriptor)
+            self.connection = sqlite3.connect(self.build_path, uri=True, check_same_thread=False)
+
+        if existing and os.path.exists(self.database_path):
+            with closing(sqlite3.connect(self.database_path)) as source:
+                source.backup(self.connection)
+        else:
+            self.set_page_size()
+
+        return self.connection
+
+    def set_page_size(self) -> None:
+        """Define o tamanho de página, que só tem efeito enquanto o banco estiver vazio.
+        Páginas maiores deixam módulos grandes menores e mais rápidos de abrir"""
+
+        if self.page_size is not None:
+            self.connection.execute(f"PRAGMA page_size = {self.page_size}")
+
+    def attach_source(self, source_path: str, alias: str = "source") -> None:
+        """Anexa o módulo de origem, somente para leitura, à conexão do banco de saída,
+        para que os registros sejam convertidos e gravados com INSERT ... SELECT.
+        Deve ser chamado fora de uma transação
+
+        Args:
+            source_path (str): Caminho do módulo MySword
+            alias (str): Nome do banco anexado nas instruções SQL
+        """
+
+        if not os.path.isfile(source_path):
+            raise FileNotFoundError(source_path)
+
+        self.connection.execute(f"ATTACH DATABASE ? AS {alias}", (SourceDatabase.uri(source_path),))
+
+    def publish(self, compact: bool = False) -> None:
+        """Grava o banco montado no caminho final e fecha a conexão.
+        A gravação deve ter sido confirmada antes (BulkWriter.commit)
+
+        Args:
+            compact (bool): Se o banco deve ser compactado (VACUUM / VACUUM INTO)
+        """
+
+        if self.in_place:
+            if compact:
+                self.connection.execute("VACUUM")
+
+            self.connection.close()
+            return
+
+        import tempfile
+
+        # Um nome único por gravação: duas conversões do mesmo módulo não disputam o arquivo parcial
+        descriptor, partial_path = tempfile.mkstemp(
+            prefix=os.path.basename(self.database_path) + ".", suffix=".partial",
+            dir=os.path.dirname(os.path.abspath(self.database_path)))
+        os.close(descriptor)
+
+        try:
+            if compact:
+                self.connection.execute("VACUUM INTO ?", (partial_path,))
+            else:
+                with closing(sqlite3.connect(partial_path)) as destination:
+                    self.connection.backup(destination)
+
+            os.replace(partial_path, self.database_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            self.discard()
+
+    def discard(self) -> None:
+        """Fecha a conexão e descarta o banco de montagem, sem tocar no caminho final"""
+
+        self.connection.close()
+
+        if self.build_path is not None and os.path.exists(self.build_path):
+            os.remove(self.build_path)
+
+        self.build_path = None
+
+
+class BulkWriter:
+    """Gravação em massa de um banco de dados de saída recém-criado.
+
+    Enquanto o módulo é gerado o banco não precisa sobreviver a uma queda
+    (em caso de erro o arquivo é descartado), então o journal e a
+    sincronização com o disco são desligados e os índices só são criados
+    depois que todos os registros forem gravados.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, cache_size: int = 64 * 1024, durable: bool = False) -> None:
+        """
+        Args:
+            connection (sqlite3.Connection): Conexão com o banco de saída, ainda vazio
+            cache_size (int): Tamanho do cache de páginas, em KiB
+            durable (bool): Mantém o journal e a sincronização com o disco, para
+            quando um módulo já existente estiver sendo alterado
+        """
+
+        self.connection = connection
+        self.deferred_indexes: list[str] = []
+
+        if not durable:
+            self.connection.execute("PRAGMA journal_mode = OFF")
+            self.connection.execute("PRAGMA synchronous = OFF")
+
+        self.connection.execute(f"PRAGMA cache_size = {-cache_size}")
+
+    def defer_index(self, sql: str) -> None:
+        """Registra um índice para ser criado somente no final da gravação
+
+        Args:
+            sql (str): Instrução CREATE INDEX
+        """
+
+        self.deferred_indexes.append(sql)
+
+    def insert(self, sql: str, rows: Iterable[tuple]) -> None:
+        """Grava um lote de registros com uma única chamada ao executemany
+
+        Args:
+            sql (str): Instrução INSERT parametrizada
+            rows (Iterable[tuple]): Os valores de cada registro
+        """
+
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+        self.connection.executemany(sql, rows)
+
+    def execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        """Executa uma instrução avulsa (ex.: DELETE) dentro da transação da gravação
+
+        Args:
+            sql (str): Instrução SQL parametrizada
+            parameters (tuple): Os valores dos parâmetros
+
+        Returns:
+            sqlite3.Cursor: O cursor da instrução (ex.: para consultar `rowcount`)
+        """
+
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+        return self.connection.execute(sql, parameters)
+
+    def commit(self) -> None:
+        """Confirma a gravação e cria os índices pendentes"""
+
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+        for sql in self.deferred_indexes:
+            self.connection.execute(sql)
+
+        self.connection.execute("COMMIT")
+        self.deferred_indexes.clear()
@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+from typing import Any, Iterable, Optional
+
+
+class Manifest:
+    """Arquivo auxiliar (JSON) gravado ao lado dos módulos convertidos, com o
+    resumo (digest) dos versículos de origem de cada capítulo e as opções que
+    alteram o conteúdo dos módulos. Permite que uma nova conversão identifique
+    quais capítulos mudaram desde a anterior"""
+
+    VERSION: int = 2
+    """Versão do formato do arquivo; manifestos de outras versões são ignorados"""
+
+    CONVERTER_VERSION: int = 1
+    """Versão da conversão dos textos; deve ser incrementada sempre que a saída
+    gerada para os mesmos versículos mudar, forçando a reconstrução dos módulos"""
+
+    def __init__(self, path: str, settings: Optional[dict[str, Any]] = None) -> None:
+        """
+        Args:
+            path (str): Caminho do arquivo
+            settings (Optional[dict[str, Any]]): As opções da conversão que alteram o conteúdo dos módulos
+        """
+
+        self.path = path
+        self.settings: dict[str, Any] = {"converter": self.CONVERTER_VERSION, **(settings or {})}
+        self.chapters: dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional['Manifest']:
+        """Carrega o manifesto de uma conversão anterior
+
+        Args:
+            path (str): Caminho do arquivo
+
+        Returns:
+            Optional[Manifest]: O manifesto ou None se não existir ou for de outra versão
+        """
+
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != cls.VERSION:
+            return None
+
+        manifest = cls(path)
+        manifest.settings = dict(data.get("settings", {}))
+        manifest.chapters = dict(data.get("chapters", {}))
+
+        return manifest
+
+    def save(self) -> None:
+        """Grava o manifesto, substituindo o arquivo anterior de forma atômica"""
+
+        temporary_path = self.path + ".tmp"
+
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({"version": self.VERSION, "settings": self.settings, "chapters": self.chapters}, file)
+
+        os.replace(temporary_path, self.path)
+
+    def compatible(self, other: 'Manifest') -> bool:
+        """Verifica se os módulos de outra conversão foram gerados com as mesmas
+        opções e a mesma versão do conversor, podendo ser atualizados capítulo a capítulo
+
+        Args:
+            other (Manifest): O manifesto da outra conversão
+
+        Returns:
+            bool: True se as opções e a versão do conversor forem iguais
+        """
+
+        return self.settings == other.settings
+
+    @staticmethod
+    def key(book: int, chapter: int) -> str:
+        """Retorna a chave do capítulo no manifesto
+
+        Args:
+            book (int): Número do livro
+            chapter (int): Número do capítulo
+
+        Returns:
+            str: A chave no formato "livro.capítulo"
+        """
+
+        return f"{book}.{chapter}"
+
+    @staticmethod
+    def digest(rows: Iterable[tuple]) -> str:
+        """Calcula o resumo dos versículos de origem de um capítulo
+
+        Args:
+            rows (Iterable[tuple]): Registros (Book, Chapter, Verse, Scripture) do capítulo
+
+        Returns:
+            str: O resumo SHA-256 em hexadecimal
+        """
+
+        digest = hashlib.sha256()
+
+        for _, _, verse, scripture in rows:
+            if isinstance(scripture, str):
+                scripture = scripture.encode("utf-8", "surrogatepass")
+
+            digest.update(f"{verse}\x1f".encode())
+            digest.update(scripture or b"")
+            digest.update(b"\x1e")
+
+        return digest.hexdigest()
@@ -0,0 +1,249 @@
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from functools import wraps
+from types import ModuleType
+from typing import Callable, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def get_peak_rss() -> int:
+    """Retorna o pico de memória residente do processo, em KiB (0 se não disponível)"""
+
+    if resource is None:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # No macOS o valor é informado em bytes, no Linux em KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure_calls(function: Callable, metrics: 'PhaseMetrics') -> Callable:
+    """Retorna uma versão da função que acumula o tempo de cada chamada em `metrics`"""
+
+    @wraps(function)
+    def measured(*args, **kwargs):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.calls += 1
+            metrics.wall_seconds += time.perf_counter() - wall
+            metrics.cpu_seconds += time.process_time() - cpu
+
+    return measured
+
+
+@dataclass
+class PhaseMetrics:
+    """Uma classe que representa as medições acumuladas de uma etapa da conversão"""
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rows: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    peak_rss_kb: int = 0
+
+
+class Metrics:
+    """Coleta o tempo (real e de CPU), a quantidade de registros, os bytes de
+    entrada e saída e o pico de memória de cada etapa da conversão.
+
+    Quando desligada, as medições não fazem nada além de executar o bloco medido.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.phases: dict[str, PhaseMetrics] = {}
+        self.functions: dict[str, PhaseMetrics] = {}
+        self.restore: list[Callable[[], None]] = []
+
+    @contextmanager
+    def phase(self, name: str, rows: int = 0, bytes_in: int = 0, bytes_out: int = 0) -> Iterator[Optional[PhaseMetrics]]:
+        """Mede o bloco como uma etapa (chamadas repetidas são somadas)
+
+        Args:
+            name (str): Nome da etapa
+            rows (int): Registros processados
+            bytes_in (int): Bytes lidos
+            bytes_out (int): Bytes gravados
+
+        Yields:
+            Optional[PhaseMetrics]: As medições da etapa, para que o bloco possa
+            somar registros e bytes (None se desligada)
+        """
+
+        if not self.enabled:
+            yield None
+            return
+
+        phase = self.phases.setdefault(name, PhaseMetrics())
+        phase.rows += rows
+        phase.bytes_in += bytes_in
+        phase.bytes_out += bytes_out
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        try:
+            yield phase
+        finally:
+            phase.calls += 1
+            phase.wall_seconds += time.perf_counter() - wall
+            phase.cpu_seconds += time.process_time() - cpu
+            phase.peak_rss_kb = get_peak_rss()
+
+    def text_bytes(self, texts: Iterable[str]) -> int:
+        """Conta os bytes (UTF-8) dos textos, somente se as medições estiverem ligadas
+
+        Args:
+            texts (Iterable[str]): Os textos
+
+        Returns:
+            int: Quantidade de bytes
+        """
+
+        if not self.enabled:
+            return 0
+
+        return sum(len(text.encode("utf-8", "surrogatepass")) if isinstance(text, str) else len(text or b"")
+                   for text in texts)
+
+    def instrument(self, module: ModuleType, names: Iterable[str]) -> None:
+        """Substitui funções do módulo por versões que medem cada chamada.
+        Os tempos são inclusivos: uma função que chama outra função medida
+        também contabiliza o tempo dela
+
+        Args:
+            module (ModuleType): O módulo (ex.: text_utils)
+            names (Iterable[str]): Os nomes das funções
+        """
+
+        if not self.enabled:
+            return
+
+        for name in names:
+            function = getattr(module, name)
+            metrics = self.functions.setdefault(f"{module.__name__}.{name}", PhaseMetrics())
+
+            setattr(module, name, measure_calls(function, metrics))
+            self.restore.append(lambda module=module, name=name, function=function: setattr(module, name, function))
+
+    def uninstrument(self) -> None:
+        """Restaura as funções substituídas por instrument"""
+
+        while self.restore:
+            self.restore.pop()()
+
+    def report(self) -> dict:
+        """Retorna o relatório das medições
+
+        Returns:
+            dict: Etapas, funções medidas e pico de memória do processo
+        """
+
+        return {
+            "phases": {name: asdict(phase) for name, phase in self.phases.items()},
+            "functions": {name: asdict(function) for name, function in self.functions.items()},
+            "peak_rss_kb": get_peak_rss(),
+        }
+
+    def save(self, path: str, **extra) -> None:
+        """Grava o relatório em JSON
+
+        Args:
+            path (str): Caminho do arquivo ("-" grava na saída padrão)
+            **extra: Informações adicionais incluídas no relatório
+        """
+
+        import json
+
+        report = {**extra, **self.report()}
+
+        if path == "-":
+            json.dump(report, sys.stdout, indent=2)
+            print()
+            return
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+def text_size(texts: Iterable[str]) -> int:
+    """Retorna a quantidade de bytes (UTF-8) dos textos"""
+
+    return sum(len(text.encode("utf-8", "surrogatepass")) for text in texts)
+
+
+class SizeReport:
+    """Relatório do tamanho dos módulos gerados: bytes dos textos de cada tabela
+    antes e depois da minificação do HTML e espaço ocupado por cada tabela no arquivo
+    """
+
+    def __init__(self) -> None:
+        self.tables: dict[str, list[int]] = {}
+        """Bytes dos textos de cada tabela: [antes, depois]"""
+
+    def add(self, table: str, before: Iterable[str], after: Iterable[str]) -> None:
+        """Soma os bytes de um lote de textos da tabela
+
+        Args:
+            table (str): Nome da tabela (ex.: Bible)
+            before (Iterable[str]): Os textos antes da minificação
+            after (Iterable[str]): Os mesmos textos depois da minificação
+        """
+
+        sizes = self.tables.setdefault(table, [0, 0])
+        sizes[0] += text_size(before)
+        sizes[1] += text_size(after)
+
+    @staticmethod
+    def table_sizes(path: str) -> dict[str, int]:
+        """Retorna o espaço ocupado no arquivo por cada tabela (com os seus índices)
+
+        Args:
+            path (str): Caminho do módulo
+
+        Returns:
+            dict[str, int]: Bytes por tabela (vazio se o SQLite não tiver a tabela dbstat)
+        """
+
+        import sqlite3
+        from contextlib import closing
+
+        with closing(sqlite3.connect(path)) as connection:
+            try:
+                rows = connection.execute("""SELECT coalesce(m.tbl_name, s.name), sum(s.pgsize) FROM dbstat s
+                                             LEFT JOIN sqlite_master m ON m.name = s.name GROUP BY 1""").fetchall()
+            except sqlite3.OperationalError:
+                return {}
+
+        return dict(rows)
+
+    def print(self, paths: Iterable[str]) -> None:
+        """Exibe os bytes economizados em cada tabela e o tamanho dos módulos
+
+        Args:
+            paths (Iterable[str]): Os módulos gerados
+        """
+
+        import os
+
+        print(f"{'Tabela':<20}{'Antes':>14}{'Depois':>14}{'Economia':>10}")
+
+        for table, (before, after) in self.tables.items():
+            saved = 100 * (before - after) / before if before else 0
+            print(f"{table:<20}{before:>14}{after:>14}{saved:>9.1f}%")
+
+        for path in paths:
+            sizes = ", ".join(f"{table} {size}" for table, size in self.table_sizes(path).items())
+            print(f"{os.path.basename(path)}: {os.path.getsize(path)} bytes" + (f" ({sizes})" if sizes else ""))
@@ -0,0 +1,152 @@
+import queue
+import threading
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+_END = object()
+"""Marca o fim dos itens de uma fila"""
+
+
+class ReaderThread(Generic[T]):
+    """Percorre um iterável (ex.: os blocos lidos do banco de origem) numa thread
+    separada, entregando os itens por uma fila limitada.
+
+    A leitura continua enquanto os itens anteriores são convertidos, mas para
+    quando a fila enche, então no máximo `maxsize` itens ficam em memória.
+    Um erro na leitura é relançado para quem percorre a ReaderThread.
+    """
+
+    def __init__(self, items: Iterable[T], maxsize: int, name: str = "leitura") -> None:
+        """
+        Args:
+            items (Iterable[T]): Os itens, percorridos somente dentro da thread
+            maxsize (int): Quantidade máxima de itens aguardando na fila
+            name (str): Nome da thread
+        """
+
+        self.items = items
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.stopped = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        try:
+            for item in self.items:
+                if not self.put(item):
+                    return
+        except BaseException as error:
+            self.error = error
+        finally:
+            self.put(_END)
+
+    def put(self, item: object) -> bool:
+        """Coloca o item na fila, esperando enquanto ela estiver cheia
+
+        Returns:
+            bool: False se a leitura foi interrompida (ver `close`)
+        """
+
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def __iter__(self) -> Iterator[T]:
+        try:
+            while True:
+                item = self.queue.get()
+
+                if item is _END:
+                    break
+
+                yield item
+        finally:
+            self.close()
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self) -> 'ReaderThread[T]':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Interrompe a leitura (se ainda não terminou) e aguarda o fim da thread"""
+
+        self.stopped.set()
+        self.thread.join()
+
+
+class WriterThread:
+    """Executa as gravações de um banco de saída, na ordem em que foram
+    enviadas, numa thread separada.
+
+    As gravações aguardam numa fila limitada: quando a fila enche, `submit`
+    espera, e a conversão não acumula em memória mais lotes do que o banco
+    consegue gravar. O sqlite3 libera o GIL durante a gravação, então a
+    conversão do próximo lote continua enquanto isso.
+    Depois de um erro as gravações seguintes são descartadas e o erro é
+    relançado pelo próximo `submit` ou por `close`.
+    """
+
+    def __init__(self, maxsize: int, name: str = "gravação") -> None:
+        """
+        Args:
+            maxsize (int): Quantidade máxima de gravações aguardando na fila
+            name (str): Nome da thread
+        """
+
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            task = self.queue.get()
+
+            if task is _END:
+                return
+
+            if self.error is not None:
+                continue
+
+            function, args = task
+
+            try:
+                function(*args)
+            except BaseException as error:
+                self.error = error
+
+    def submit(self, function: Callable[..., object], *args: object) -> None:
+        """Envia uma gravação para a thread
+
+        Args:
+            function (Callable[..., object]): A função que grava (ex.: save_pure_bible)
+            *args (object): Os argumentos da função
+        """
+
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put((function, args))
+
+    def close(self) -> None:
+        """Aguarda as gravações pendentes e encerra a thread, relançando o erro
+        de alguma gravação"""
+
+        self.queue.put(_END)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class TransformCache:
+    """Cache LRU de tamanho limitado para as conversões do text_utils, indexado
+    pelo trecho de entrada (ex.: o conteúdo de um comentário <RF><Rf>).
+
+    Opcionalmente os resultados são gravados num banco SQLite, para serem
+    reaproveitados nas próximas execuções do conversor.
+    """
+
+    VERSION: int = 1
+    """Versão dos resultados gravados; deve mudar sempre que as conversões do text_utils mudarem"""
+
+    def __init__(self, maxsize: int = 16384, max_fragment_size: int = 64 * 1024, path: Optional[str] = None) -> None:
+        """
+        Args:
+            maxsize (int): Quantidade máxima de resultados mantidos em memória (0 desliga o cache)
+            max_fragment_size (int): Trechos maiores que isso (em caracteres) não são armazenados
+            path (Optional[str]): Caminho do banco SQLite onde os resultados são persistidos
+        """
+
+        self.maxsize = maxsize
+        self.max_fragment_size = max_fragment_size
+        self.path = path
+
+        self.entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self.pending: list[tuple[str, str, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pid: Optional[int] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Abre (uma vez por processo) a conexão com o banco de persistência"""
+
+        if self.path is None:
+            return None
+
+        # Conexões SQLite não podem ser compartilhadas com processos filhos
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=30)
+            self.connection.execute("PRAGMA journal_mode = WAL")
+
+            # Vários processos podem abrir o mesmo banco ao mesmo tempo
+            self.connection.execute("BEGIN IMMEDIATE")
+
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+                self.connection.execute("DROP TABLE IF EXISTS cache")
+                self.connection.execute(
+                    "CREATE TABLE cache (name TEXT, fragment TEXT, result TEXT, PRIMARY KEY (name, fragment))")
+                self.connection.execute(f"PRAGMA user_version = {self.VERSION}")
+
+            self.connection.commit()
+
+            self.pid = os.getpid()
+            self.pending.clear()
+
+        return self.connection
+
+    def get(self, name: str, fragment: str, transform: Callable[[str], str]) -> str:
+        """Retorna a conversão do trecho, calculando-a somente se ainda não estiver no cache
+
+        Args:
+            name (str): Nome da conversão (separa os resultados de conversões diferentes)
+            fragment (str): Trecho de entrada
+            transform (Callable[[str], str]): A conversão propriamente dita
+
+        Returns:
+            str: O trecho convertido
+        """
+
+        if self.maxsize <= 0 or len(fragment) > self.max_fragment_size:
+            return transform(fragment)
+
+        key = (name, fragment)
+        result = self.entries.get(key)
+
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        connection = self._connect()
+
+        if connection is not None:
+            row = connection.execute(
+                "SELECT result FROM cache WHERE name = ? AND fragment = ?", key).fetchone()
+
+            if row is not None:
+                result = row[0]
+                self.persistent_hits += 1
+
+        if result is None:
+            result = transform(fragment)
+            self.misses += 1
+
+            if connection is not None:
+                self.pending.append((name, fragment, result))
+
+        self.entries[key] = result
+
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        return result
+
+    def flush(self) -> None:
+        """Grava no banco de persistência os resultados calculados desde a última gravação"""
+
+        if not self.pending or self.pid != os.getpid():
+            return
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache (name, fragment, result) VALUES (?, ?, ?)", self.pending)
+
+        self.pending.clear()
+
+    def take_statistics(self) -> dict[str, int]:
+        """Retorna as estatísticas acumuladas e as zera (usado para somar as
+        estatísticas dos processos filhos no processo principal)
+
+        Returns:
+            dict[str, int]: Acertos, acertos no banco de persistência e falhas
+        """
+
+        statistics = self.statistics()
+        self.hits = self.persistent_hits = self.misses = 0
+
+        return statistics
+
+    def add_statistics(self, statistics: dict[str, int]) -> None:
+        """Soma estatísticas vindas de outro processo
+
+        Args:
+            statistics (dict[str, int]): Estatísticas retornadas por take_statistics
+        """
+
+        self.hits += statistics["hits"]
+        self.persistent_hits += statistics["persistent_hits"]
+        self.misses += statistics["misses"]
+
+    def statistics(self) -> dict[str, int]:
+        """Retorna as estatísticas de uso do cache
+
+        Returns:
+            dict[str, int]: Acertos, acertos no banco de persistência, falhas e tamanho atual
+        """
+
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+        }
+
+    def close(self) -> None:
+        """Grava os resultados pendentes e fecha o banco de persistência"""
+
+        self.flush()
+
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+
+        self.connection = None
+        self.pid = None
@@ -17,3 +17,17 @@ class Utils:
 
         os.makedirs(temporary_directory)
         return temporary_directory
+
+    @classmethod
+    def get_module_name(cls, path: str) -> str:
+        """Retorna o nome do módulo, sem o diretório e sem as extensões.
+        Exemplo: ./modulos/biblia.bbl.mybible -> biblia
+
+        Args:
+            path (str): Caminho do módulo MySword
+
+        Returns:
+            str: Nome do módulo
+        """
+
+        return os.path.basename(path).split('.')[0]
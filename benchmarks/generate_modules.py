@@ -0,0 +1,209 @@
+"""Gera módulos MySword sintéticos (.bbl.mybible e .cmt.mybible) para os benchmarks.
+
+Os módulos seguem o esquema das tabelas Bible, Details e Commentary da MySword,
+com tamanho e densidade de tags configuráveis, e são determinísticos para uma
+mesma semente.
+"""
+import os
+import random
+import sqlite3
+import argparse
+from dataclasses import dataclass
+
+
+WORDS = ("e", "disse", "Deus", "haja", "luz", "o", "Senhor", "povo", "terra", "céus",
+         "palavra", "fez", "criou", "sobre", "águas", "espírito", "dia", "noite", "filhos", "rei")
+
+BOOK_NAMES = ("Gênesis", "Êxodo", "Salmos", "Isaías", "Mateus", "João", "Romanos", "1Coríntios", "Hebreus", "Apocalipse")
+
+
+@dataclass
+class ModuleOptions:
+    """Tamanho e densidade de tags dos módulos gerados"""
+    books: int = 66
+    chapters: int = 25
+    verses: int = 20
+    words: int = 25
+    rf_density: float = 0.5
+    """Fração dos versículos com comentários <RF><Rf> (0 gera uma bíblia comum)"""
+    ts_density: float = 0.05
+    """Fração dos versículos com títulos <TS><Ts>"""
+    strong_density: float = 0.3
+    """Fração das palavras seguidas de um número strong <WH..>/<WG..>"""
+    link_density: float = 0.5
+    """Quantidade média de links <a href=b..> por comentário"""
+    seed: int = 0
+
+
+def random_reference(generator: random.Random) -> str:
+    """Gera um link de referência bíblica no formato da MySword"""
+    book = generator.randint(1, 66)
+    chapter = generator.randint(1, 50)
+    verse = generator.randint(1, 30)
+    name = generator.choice(BOOK_NAMES)
+
+    if generator.random() < 0.5:
+        return f"<a class='bible' href='#b{book}.{chapter}.{verse}'>{name} {chapter}:{verse}</a>"
+
+    return f"<a href='b{book}.{chapter}.{verse}-{verse + 2}'>{name} {chapter}:{verse}-{verse + 2}</a>"
+
+
+def random_sentence(generator: random.Random, options: ModuleOptions, strong_prefix: str) -> str:
+    """Gera uma frase com números strong intercalados de acordo com a densidade configurada"""
+    parts = []
+
+    for _ in range(options.words):
+        parts.append(generator.choice(WORDS))
+
+        if generator.random() < options.strong_density:
+            parts.append(f"<W{strong_prefix}{generator.randint(1, 8674)}>")
+
+    return " ".join(parts)
+
+
+def random_commentary(generator: random.Random, options: ModuleOptions, shared_notes: list[str]) -> str:
+    """Gera o conteúdo de um comentário, com links e referências em texto"""
+    # Parte dos comentários se repete entre versículos, como nas bíblias de estudo reais
+    if shared_notes and generator.random() < 0.3:
+        return generator.choice(shared_notes)
+
+    text = random_sentence(generator, options, "G")
+
+    while generator.random() < options.link_density:
+        text += " " + random_reference(generator)
+
+    return f"{text} {generator.choice(BOOK_NAMES)} {generator.randint(1, 50)}:{generator.randint(1, 30)}"
+
+
+def generate_bible(path: str, options: ModuleOptions) -> int:
+    """Gera uma bíblia MySword sintética
+
+    Args:
+        path (str): Caminho do arquivo .bbl.mybible (substituído se existir)
+        options (ModuleOptions): Tamanho e densidade de tags
+
+    Returns:
+        int: Quantidade de versículos gerados
+    """
+    generator = random.Random(options.seed)
+    shared_notes = [random_commentary(generator, options, []) for _ in range(50)]
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+    CREATE TABLE Bible (Book INT, Chapter INT, Verse INT, Scripture TEXT);
+    CREATE TABLE Details (Description NVARCHAR(255), Abbreviation NVARCHAR(50), Comments TEXT, Version TEXT,
+                          VersionDate DATETIME, PublishDate DATETIME, RightToLeft BOOL, OT BOOL, NT BOOL, Strong BOOL);
+    """)
+    connection.execute("INSERT INTO Details VALUES ('Bíblia sintética', 'SINT', 'Gerada para benchmarks', '1', NULL, NULL, 0, 1, 1, 1)")
+
+    def rows():
+        for book in range(1, options.books + 1):
+            for chapter in range(1, options.chapters + 1):
+                for verse in range(1, options.verses + 1):
+                    text = ""
+
+                    if generator.random() < options.ts_density:
+                        text += f"<TS>{random_sentence(generator, ModuleOptions(words=4, strong_density=0), '')}<Ts>"
+
+                    text += random_sentence(generator, options, "H" if book < 40 else "G")
+
+                    if generator.random() < 0.2:
+                        text += f" <FI>{generator.choice(WORDS)}<Fi> <CM>"
+
+                    if generator.random() < options.strong_density:
+                        text += " <WTV-QAL-PERF>"
+
+                    while generator.random() < options.rf_density:
+                        text += f"<RF q=a>{random_commentary(generator, options, shared_notes)}<Rf>"
+
+                    yield book, chapter, verse, text
+
+    connection.executemany("INSERT INTO Bible VALUES (?, ?, ?, ?)", rows())
+    connection.execute("CREATE INDEX BookChapterVerseIndex ON Bible (Book, Chapter, Verse)")
+    connection.commit()
+
+    count = connection.execute("SELECT count(*) FROM Bible").fetchone()[0]
+    connection.close()
+
+    return count
+
+
+def generate_commentary(path: str, options: ModuleOptions) -> int:
+    """Gera um comentário MySword sintético
+
+    Args:
+        path (str): Caminho do arquivo .cmt.mybible (substituído se existir)
+        options (ModuleOptions): Tamanho e densidade de tags
+
+    Returns:
+        int: Quantidade de registros gerados
+    """
+    generator = random.Random(options.seed)
+    shared_notes = [random_commentary(generator, options, []) for _ in range(50)]
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+    CREATE TABLE Commentary (id INTEGER PRIMARY KEY, book INT, chapter INT, fromverse INT, toverse INT, data TEXT);
+    CREATE TABLE Details (Title NVARCHAR(255), Abbreviation NVARCHAR(50), Description TEXT, Comments TEXT, Version TEXT);
+    """)
+    connection.execute("INSERT INTO Details VALUES ('Comentário sintético', 'SINT', 'Gerado para benchmarks', '', '1')")
+
+    def rows():
+        for book in range(1, options.books + 1):
+            yield book, 0, 0, 0, f"<p>{random_sentence(generator, options, 'G')}</p>"
+
+            for chapter in range(1, options.chapters + 1):
+                yield book, chapter, 0, 0, f"<p align='center'>{random_sentence(generator, options, 'G')}</p>"
+
+                verse = 1
+
+                while verse <= options.verses:
+                    to_verse = min(options.verses, verse + generator.randint(0, 2))
+                    paragraphs = "".join(f"<p>{random_commentary(generator, options, shared_notes)}</p>"
+                                         for _ in range(generator.randint(1, 4)))
+
+                    yield book, chapter, verse, to_verse, paragraphs
+                    verse = to_verse + 1
+
+    connection.executemany(
+        "INSERT INTO Commentary (book, chapter, fromverse, toverse, data) VALUES (?, ?, ?, ?, ?)", rows())
+    connection.commit()
+
+    count = connection.execute("SELECT count(*) FROM Commentary").fetchone()[0]
+    connection.close()
+
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera módulos MySword sintéticos para os benchmarks")
+    parser.add_argument("directory", help="Diretório onde os módulos serão gravados")
+    parser.add_argument("--name", default="sintetico", help="Nome dos módulos gerados")
+    parser.add_argument("--books", type=int, default=ModuleOptions.books)
+    parser.add_argument("--chapters", type=int, default=ModuleOptions.chapters)
+    parser.add_argument("--verses", type=int, default=ModuleOptions.verses)
+    parser.add_argument("--words", type=int, default=ModuleOptions.words)
+    parser.add_argument("--rf-density", type=float, default=ModuleOptions.rf_density)
+    parser.add_argument("--ts-density", type=float, default=ModuleOptions.ts_density)
+    parser.add_argument("--strong-density", type=float, default=ModuleOptions.strong_density)
+    parser.add_argument("--link-density", type=float, default=ModuleOptions.link_density)
+    parser.add_argument("--seed", type=int, default=ModuleOptions.seed)
+    arguments = parser.parse_args()
+
+    module_options = ModuleOptions(arguments.books, arguments.chapters, arguments.verses, arguments.words,
+                                   arguments.rf_density, arguments.ts_density, arguments.strong_density,
+                                   arguments.link_density, arguments.seed)
+
+    os.makedirs(arguments.directory, exist_ok=True)
+
+    bible_path = os.path.join(arguments.directory, f"{arguments.name}.bbl.mybible")
+    commentary_path = os.path.join(arguments.directory, f"{arguments.name}.cmt.mybible")
+
+    print(f"{bible_path}: {generate_bible(bible_path, module_options)} versículos")
+    print(f"{commentary_path}: {generate_commentary(commentary_path, module_options)} comentários")
@@ -0,0 +1,283 @@
+"""Mede a vazão de cada etapa da conversão sobre módulos sintéticos e compara
+com uma linha de base gravada anteriormente.
+
+Uso:
+    python benchmarks/run_benchmarks.py                  # mede e compara com benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline  # mede e grava a nova linha de base
+    python benchmarks/run_benchmarks.py --require-baseline  # na CI: falha se não houver linha de base
+
+Sai com código 1 quando alguma etapa fica mais lenta que a linha de base além da tolerância
+(ou, com --require-baseline, quando não há uma linha de base comparável).
+
+A linha de base guarda também as condições da medição (opções do módulo sintético,
+repetições, tamanho dos lotes, Python e máquina). Se forem diferentes das atuais,
+a comparação é só exibida, com um aviso, sem apontar regressões.
+"""
+import io
+import os
+import sys
+import json
+import time
+import platform
+import sqlite3
+import argparse
+import tempfile
+from contextlib import closing, redirect_stdout
+from dataclasses import asdict
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import convert_bible  # noqa: E402
+import convert_commentary  # noqa: E402
+from constants import BATCH_SIZE  # noqa: E402
+from Database import BibleScan, SourceDatabase  # noqa: E402
+from models import BibleBatch  # noqa: E402
+from TransformCache import TransformCache  # noqa: E402
+from generate_modules import ModuleOptions, generate_bible, generate_commentary  # noqa: E402
+
+
+DEFAULT_BASELINE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+"""Arquivo padrão da linha de base"""
+
+
+def measure(function: Callable[[], None], repeat: int) -> float:
+    """Executa a função várias vezes e retorna o menor tempo (em segundos)"""
+
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def throughput(seconds: float, rows: int, size: int) -> dict[str, float]:
+    """Calcula a vazão de uma etapa"""
+
+    return {
+        "seconds": seconds,
+        "rows": rows,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "mb_per_second": size / seconds / 1024 / 1024 if seconds else 0.0,
+    }
+
+
+def text_size(rows: list[tuple]) -> int:
+    """Quantidade de bytes (UTF-8) dos textos dos registros"""
+
+    return sum(len(row[-1].encode("utf-8")) for row in rows)
+
+
+def benchmark_bible(path: str, directory: str, repeat: int) -> dict[str, dict[str, float]]:
+    """Mede as etapas da conversão de uma bíblia"""
+
+    results: dict[str, dict[str, float]] = {}
+    rows: list[tuple] = []
+
+    def read() -> None:
+        with closing(SourceDatabase(path).connect()) as connection:
+            scan = BibleScan(connection)
+            scan.prepare(connection)
+            cursor = connection.execute(scan.query())
+            rows[:] = list(convert_bible.fetch_rows(cursor))
+
+    seconds = measure(read, repeat)
+    size = text_size(rows)
+    results["read"] = throughput(seconds, len(rows), size)
+
+    batches = [BibleBatch.from_rows(batch) for batch in convert_bible.batched(rows)]
+    transformed: list[tuple] = []
+
+    def transform() -> None:
+        convert_bible.transform_cache = TransformCache()
+        transformed[:] = [convert_bible.transform_rows(batch) for batch in batches]
+
+    results["text_utils"] = throughput(measure(transform, repeat), len(rows), size)
+
+    pure_size = sum(len(text.encode("utf-8")) for pure, _ in transformed for text in pure.texts)
+    commentary_rows = sum(len(commentaries) for _, commentaries in transformed)
+    commentary_size = sum(len(text.encode("utf-8"))
+                          for _, commentaries in transformed for text in commentaries.texts)
+
+    converter = convert_bible.BibleConverter(os.path.join(directory, "benchmark.bbl.mybible"), directory)
+
+    with closing(SourceDatabase(path).connect()) as connection:
+        converter.input_database = connection
+
+        def save_pure_bible() -> None:
+            converter.configure_output_bible_database()
+
+            for pure, _ in transformed:
+                converter.save_pure_bible(pure)
+
+            converter.finish_output_database(converter.output_bible_database, converter.output_bible_writer)
+
+        def save_commentaries() -> None:
+            converter.configure_commentary_database()
+
+            for _, commentaries in transformed:
+                converter.save_commentaries(commentaries)
+
+            converter.finish_output_database(converter.output_commentary_database,
+                                             converter.output_commentary_writer)
+
+        results["save_pure_bible"] = throughput(measure(save_pure_bible, repeat), len(rows), pure_size)
+
+        if commentary_rows:
+            results["save_commentaries"] = throughput(
+                measure(save_commentaries, repeat), commentary_rows, commentary_size)
+
+    def convert() -> None:
+        with redirect_stdout(io.StringIO()):
+            convert_bible.transform_cache = TransformCache()
+            convert_bible.convert(path, directory)
+
+    results["convert_bible"] = throughput(measure(convert, repeat), len(rows), size)
+
+    return results
+
+
+def benchmark_commentary(path: str, directory: str, repeat: int) -> dict[str, dict[str, float]]:
+    """Mede a conversão completa de um comentário"""
+
+    with closing(sqlite3.connect(path)) as connection:
+        rows, size = connection.execute(
+            "SELECT count(*), coalesce(sum(length(CAST(data AS BLOB))), 0) FROM Commentary").fetchone()
+
+    def convert() -> None:
+        output_path = os.path.join(directory, f"{os.path.basename(path).split('.')[0]}.cmti")
+
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+        with redirect_stdout(io.StringIO()):
+            convert_commentary.convert(path, directory)
+
+    return {"convert_commentary": throughput(measure(convert, repeat), rows, size)}
+
+
+def measurement_meta(options: ModuleOptions, repeat: int) -> dict[str, Any]:
+    """As condições da medição, gravadas com a linha de base"""
+
+    return {
+        "module": asdict(options),
+        "repeat": repeat,
+        "batch_size": BATCH_SIZE,
+        "python": f"{platform.python_implementation()} {'.'.join(platform.python_version_tuple()[:2])}",
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def meta_differences(meta: dict[str, Any], baseline_meta: dict[str, Any]) -> list[str]:
+    """Retorna as condições da medição atual que diferem das da linha de base"""
+
+    return [f"{key}: {baseline_meta.get(key)!r} -> {value!r}"
+            for key, value in meta.items() if baseline_meta.get(key) != value]
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float) -> list[str]:
+    """Exibe os resultados lado a lado com a linha de base
+
+    Returns:
+        list[str]: As etapas que ficaram mais lentas que a tolerância permite
+    """
+
+    regressions: list[str] = []
+
+    print(f"{'Etapa':20} {'registros/s':>14} {'MB/s':>9} {'base MB/s':>10} {'variação':>9}")
+
+    for stage, result in results.items():
+        reference = baseline.get(stage)
+        line = f"{stage:20} {result['rows_per_second']:14.0f} {result['mb_per_second']:9.2f}"
+
+        if reference and reference.get("rows_per_second"):
+            ratio = result["rows_per_second"] / reference["rows_per_second"]
+            line += f" {reference['mb_per_second']:10.2f} {ratio - 1:+9.1%}"
+
+            if ratio < 1 - tolerance:
+                regressions.append(stage)
+                line += "  <- regressão"
+
+        print(line)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks das etapas da conversão")
+    parser.add_argument("--books", type=int, default=ModuleOptions.books)
+    parser.add_argument("--chapters", type=int, default=ModuleOptions.chapters)
+    parser.add_argument("--verses", type=int, default=ModuleOptions.verses)
+    parser.add_argument("--rf-density", type=float, default=ModuleOptions.rf_density)
+    parser.add_argument("--strong-density", type=float, default=ModuleOptions.strong_density)
+    parser.add_argument("--link-density", type=float, default=ModuleOptions.link_density)
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções de cada etapa (vale a mais rápida)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Arquivo JSON da linha de base")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava os resultados como nova linha de base")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="Sai com erro se a linha de base não existir (para a CI)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Perda de vazão aceita em relação à linha de base (0.2 = 20%%)")
+    arguments = parser.parse_args()
+
+    options = ModuleOptions(books=arguments.books, chapters=arguments.chapters, verses=arguments.verses,
+                            rf_density=arguments.rf_density, strong_density=arguments.strong_density,
+                            link_density=arguments.link_density)
+
+    with tempfile.TemporaryDirectory() as directory:
+        bible_path = os.path.join(directory, "sintetico.bbl.mybible")
+        commentary_path = os.path.join(directory, "sintetico.cmt.mybible")
+        output_directory = os.path.join(directory, "output")
+        os.makedirs(output_directory)
+
+        print(f"Gerando módulos sintéticos ({generate_bible(bible_path, options)} versículos, "
+              f"{generate_commentary(commentary_path, options)} comentários, lotes de {BATCH_SIZE})...\n")
+
+        results = benchmark_bible(bible_path, output_directory, arguments.repeat)
+        results.update(benchmark_commentary(commentary_path, output_directory, arguments.repeat))
+
+    meta = measurement_meta(options, arguments.repeat)
+    baseline: dict[str, dict[str, float]] = {}
+    comparable = False
+
+    if arguments.save_baseline:
+        pass
+    elif not os.path.exists(arguments.baseline):
+        print(f"Aviso: a linha de base {arguments.baseline} não existe - nenhuma regressão será verificada\n")
+    else:
+        with open(arguments.baseline, encoding="utf-8") as file:
+            stored = json.load(file)
+
+        # Linhas de base antigas guardavam somente os resultados
+        baseline = stored.get("results", {}) if "meta" in stored else stored
+        differences = meta_differences(meta, stored.get("meta", {}))
+        comparable = not differences
+
+        if differences:
+            print("Aviso: a linha de base foi medida em outras condições - a comparação é só informativa:")
+
+            for difference in differences:
+                print(f"\t{difference}")
+
+            print()
+
+    regressions = compare(results, baseline, arguments.tolerance)
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w", encoding="utf-8") as file:
+            json.dump({"meta": meta, "results": results}, file, indent=2)
+
+        print(f"\nLinha de base gravada em {arguments.baseline}")
+
+    if regressions and comparable:
+        print(f"\nEtapas mais lentas que a linha de base: {', '.join(regressions)}")
+        sys.exit(1)
+
+    if not comparable and not arguments.save_baseline and arguments.require_baseline:
+        sys.exit(1)
@@ -0,0 +1,85 @@
+"""Mede o tempo das conversões do text_utils sobre versículos malformados
+(tags sem fechamento repetidas milhares de vezes) de tamanhos crescentes e
+verifica se o tempo cresce de forma linear com o tamanho do versículo.
+
+Uso:
+    python benchmarks/run_pathological.py
+    python benchmarks/run_pathological.py --repetitions 20000 --growth 4
+
+Sai com código 1 quando, ao multiplicar o tamanho do versículo por `growth`,
+o tempo de algum caso cresce mais que `growth` vezes a tolerância.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_utils  # noqa: E402
+
+
+CASES: dict[str, str] = {
+    "rf_sem_fechamento": "<RF>nota ",
+    "rf_sem_maior": "<RF q=a ",
+    "fi_sem_fechamento": "<FI>palavra ",
+    "ts_sem_fechamento": "<TS>título ",
+    "ts_nivel_sem_fechamento": "<TS2>título ",
+    "wt_sem_maior": "<WT",
+    "link_sem_fechamento": "<a href='b43.3.16'>João 3:16 ",
+    "font_sem_maior": "<font color ",
+    "linhas_com_rf": "<RF>nota\n",
+}
+"""Trecho repetido em cada caso para montar o versículo malformado"""
+
+FUNCTIONS: tuple[str, ...] = (
+    "extract_verse_text", "extract_verse_commentary", "convert_verse",
+    "convert_commentary_text", "minify_markup", "find_malformed_tags",
+)
+"""Funções do text_utils aplicadas a cada versículo"""
+
+
+def measure(text: str) -> float:
+    """Retorna o tempo (em segundos) de todas as FUNCTIONS sobre o texto"""
+
+    start = time.perf_counter()
+
+    for name in FUNCTIONS:
+        getattr(text_utils, name)(text)
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das conversões com versículos malformados")
+    parser.add_argument("--repetitions", type=int, default=5000,
+                        help="Quantas vezes o trecho de cada caso é repetido no versículo menor")
+    parser.add_argument("--growth", type=int, default=4,
+                        help="Quantas vezes o versículo maior é maior que o menor")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="Crescimento do tempo aceito além do linear (2.0 = o dobro)")
+    arguments = parser.parse_args()
+
+    failures: list[str] = []
+
+    print(f"{'Caso':26} {'bytes':>10} {'tempo (s)':>10} {'bytes x' + str(arguments.growth):>10} {'tempo (s)':>10} {'crescimento':>12}")
+
+    for name, fragment in CASES.items():
+        small = fragment * arguments.repetitions
+        large = fragment * (arguments.repetitions * arguments.growth)
+
+        small_seconds = min(measure(small) for _ in range(3))
+        large_seconds = min(measure(large) for _ in range(3))
+        growth = large_seconds / small_seconds if small_seconds else 0.0
+
+        line = f"{name:26} {len(small):10} {small_seconds:10.4f} {len(large):10} {large_seconds:10.4f} {growth:11.1f}x"
+
+        if growth > arguments.growth * arguments.tolerance:
+            failures.append(name)
+            line += "  <- não linear"
+
+        print(line)
+
+    if failures:
+        print(f"\nCasos com tempo não linear: {', '.join(failures)}")
+        sys.exit(1)
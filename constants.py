@@ -1,3 +1,9 @@
+BATCH_SIZE = 1000
+"""Quantidade máxima de registros lidos, convertidos e gravados de cada vez"""
+
+PIPELINE_QUEUE_SIZE = 4
+"""Quantidade máxima de lotes aguardando em cada fila das threads de leitura e gravação"""
+
 ABBREVIATIONS = {
     '1':	'Gen',
     '2':	'Exo',
@@ -0,0 +1,541 @@
+import io
+import os
+import sys
+import glob
+import math
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+from contextlib import closing, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+from typing import Optional
+
+import convert_bible
+import convert_commentary
+from Database import OUTPUT_TARGETS, BulkWriter, OutputDatabase, SourceDatabase
+from Utils import Utils
+from models import BatchJob, BatchResult, ConversionOptions, ModuleSurvey
+
+
+BIBLE_EXTENSION: str = ".bbl.mybible"
+"""Extensão das bíblias MySword"""
+
+COMMENTARY_EXTENSION: str = ".cmt.mybible"
+"""Extensão dos comentários MySword"""
+
+OUTPUT_EXTENSIONS: tuple[str, ...] = (".bbli", ".cmti")
+"""Extensões dos módulos gerados no padrão e-Sword HD"""
+
+ROW_COST: int = 256
+"""Custo fixo estimado da conversão de cada registro, em bytes de texto equivalentes"""
+
+
+def is_module(path: str) -> bool:
+    """Checa se o arquivo é uma bíblia ou um comentário MySword
+
+    Args:
+        path (str): Caminho do arquivo
+
+    Returns:
+        bool: Verdadeiro ou falso
+    """
+    return path.endswith((BIBLE_EXTENSION, COMMENTARY_EXTENSION)) and os.path.isfile(path)
+
+
+def find_modules(patterns: list[str]) -> list[str]:
+    """Localiza os módulos MySword a partir de diretórios ou padrões glob
+
+    Args:
+        patterns (list[str]): Diretórios (percorridos recursivamente) ou padrões glob
+
+    Returns:
+        list[str]: Caminhos dos módulos encontrados, ordenados e sem repetição
+    """
+    modules: set[str] = set()
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                modules.update(os.path.join(root, file) for file in files)
+        else:
+            modules.update(glob.glob(pattern, recursive=True))
+
+    return sorted(path for path in modules if is_module(path))
+
+
+def survey_module(path: str) -> ModuleSurvey:
+    """Estima o custo da conversão de cada livro do módulo, a partir da quantidade de
+    registros e dos bytes dos textos da tabela Bible (ou Commentary), e checa se a
+    bíblia tem comentários, numa única leitura da tabela (executado nos processos filhos)
+
+    Args:
+        path (str): Caminho do módulo MySword
+
+    Returns:
+        ModuleSurvey: O custo de cada livro (se a tabela não puder ser lida, o tamanho
+        do arquivo, num único item com a chave None) e se é uma bíblia de estudos
+    """
+    if path.endswith(BIBLE_EXTENSION):
+        # Mesma condição da conversão dentro do SQLite (ver BibleConverter.process_attached_database)
+        sql = "SELECT Book, count(*), sum(length(Scripture)), max(instr(Scripture, '<RF') > 0) FROM Bible GROUP BY Book"
+    else:
+        sql = "SELECT book, count(*), sum(length(data)), 0 FROM Commentary GROUP BY book"
+
+    try:
+        with closing(SourceDatabase(path).connect()) as connection:
+            rows = connection.execute(sql).fetchall()
+    except sqlite3.Error:
+        rows = []
+
+    if not rows:
+        return ModuleSurvey(path, {None: os.path.getsize(path)})
+
+    return ModuleSurvey(path, {book: count * ROW_COST + int(size or 0) for book, count, size, _ in rows},
+                        any(study for *_, study in rows))
+
+
+def module_extensions(survey: ModuleSurvey) -> list[str]:
+    """Retorna as extensões dos arquivos gerados pela conversão do módulo
+
+    Args:
+        survey (ModuleSurvey): O levantamento do módulo
+
+    Returns:
+        list[str]: O .bbli (e o .cmti das bíblias de estudo) de uma bíblia ou o .cmti de um comentário
+    """
+    if not survey.path.endswith(BIBLE_EXTENSION):
+        return [".cmti"]
+
+    if survey.study_bible:
+        return list(OUTPUT_EXTENSIONS)
+
+    return [".bbli"]
+
+
+def assign_output_names(surveys: list[ModuleSurvey]) -> dict[str, str]:
+    """Escolhe o nome dos arquivos gerados por cada módulo. Quando um arquivo já
+    seria gravado por outro módulo (ex.: uma bíblia de estudos e um comentário com
+    o mesmo nome gravariam o mesmo .cmti), o módulo recebe um sufixo numérico (nome_2)
+
+    Args:
+        surveys (list[ModuleSurvey]): O levantamento de cada módulo
+
+    Returns:
+        dict[str, str]: O nome dos arquivos gerados, pelo caminho do módulo
+    """
+    taken: set[str] = set()
+    names: dict[str, str] = {}
+
+    # As bíblias primeiro: mantêm o nome, e o .bbli e o .cmti de uma bíblia de estudos ficam juntos
+    for survey in sorted(surveys, key=lambda survey: not survey.path.endswith(BIBLE_EXTENSION)):
+        extensions = module_extensions(survey)
+        name = base = Utils.get_module_name(survey.path)
+        number = 1
+
+        while any(name + extension in taken for extension in extensions):
+            number += 1
+            name = f"{base}_{number}"
+
+        taken.update(name + extension for extension in extensions)
+        names[survey.path] = name
+
+    return names
+
+
+def shared_names(names: dict[str, str]) -> set[str]:
+    """Retorna os nomes usados ao mesmo tempo por uma bíblia e por um comentário.
+    Como assign_output_names não repete arquivos, essas bíblias não são de
+    estudos, e o .cmti com o mesmo nome pertence ao comentário
+
+    Args:
+        names (dict[str, str]): O nome dos arquivos gerados por cada módulo (ver assign_output_names)
+
+    Returns:
+        set[str]: Os nomes dos módulos
+    """
+    bibles = {name for path, name in names.items() if path.endswith(BIBLE_EXTENSION)}
+    commentaries = {name for path, name in names.items() if not path.endswith(BIBLE_EXTENSION)}
+
+    return bibles & commentaries
+
+
+def remove_previous_output(path: str, directory: str, options: Optional[ConversionOptions] = None) -> None:
+    """Remove os arquivos gerados por uma conversão anterior do mesmo módulo
+
+    Args:
+        path (str): Caminho do módulo MySword
+        directory (str): Diretório de saída
+        options (Optional[ConversionOptions]): Opções da conversão (com `keep_commentary`,
+        o .cmti de uma bíblia é mantido)
+    """
+    options = options or ConversionOptions()
+    name = options.output_name or Utils.get_module_name(path)
+
+    if not path.endswith(BIBLE_EXTENSION):
+        extensions = [".cmti"]
+    elif options.keep_commentary:
+        extensions = [".bbli"]
+    else:
+        extensions = list(OUTPUT_EXTENSIONS)
+
+    for extension in extensions:
+        output_path = os.path.join(directory, name + extension)
+
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+
+def split_books(costs: dict[Optional[int], int], parts: int) -> list[tuple[int, int, int]]:
+    """Divide os livros de uma bíblia em intervalos consecutivos de custo parecido
+
+    Args:
+        costs (dict[Optional[int], int]): O custo de cada livro (ver survey_module)
+        parts (int): Quantidade máxima de intervalos
+
+    Returns:
+        list[tuple[int, int, int]]: O primeiro livro, o último e o custo de cada
+        intervalo (vazia se os livros não puderem ser divididos)
+    """
+    if not all(isinstance(book, int) for book in costs):
+        return []
+
+    books = sorted(costs)
+    parts = min(parts, len(books))
+    target = sum(costs.values()) / parts
+
+    ranges: list[tuple[int, int, int]] = []
+    first, cost = books[0], 0
+
+    for position, book in enumerate(books):
+        cost += costs[book]
+        remaining_books = len(books) - position - 1
+        remaining_parts = parts - len(ranges) - 1
+
+        # Fecha o intervalo ao atingir o custo médio, deixando ao menos um livro para cada intervalo seguinte
+        if remaining_parts and (cost >= target or remaining_books == remaining_parts):
+            ranges.append((first, book, cost))
+            first, cost = books[position + 1], 0
+
+    ranges.append((first, books[-1], cost))
+
+    return ranges
+
+
+def plan_jobs(surveys: list[ModuleSurvey], workers: int, split: bool = False) -> list[BatchJob]:
+    """Ordena as conversões do maior para o menor custo estimado, para que nenhum
+    módulo grande fique por último com os outros processos parados
+
+    Args:
+        surveys (list[ModuleSurvey]): O levantamento de cada módulo (ver survey_module)
+        workers (int): Quantidade de processos
+        split (bool): Se as bíblias maiores que a parte de um processo (custo total
+        dividido pelos processos) devem ser divididas em intervalos de livros
+
+    Returns:
+        list[BatchJob]: As conversões, na ordem em que devem ser iniciadas
+    """
+    share = sum(sum(survey.costs.values()) for survey in surveys) / workers
+    jobs: list[BatchJob] = []
+
+    for survey in surveys:
+        path, books = survey.path, survey.costs
+        cost = sum(books.values())
+
+        if split and path.endswith(BIBLE_EXTENSION) and cost > share:
+            ranges = split_books(books, min(workers, math.ceil(cost / share)))
+
+            if len(ranges) > 1:
+                jobs.extend(BatchJob(path, part_cost, (first, last)) for first, last, part_cost in ranges)
+                continue
+
+        jobs.append(BatchJob(path, cost))
+
+    return sorted(jobs, key=lambda job: job.cost, reverse=True)
+
+
+def merge_parts(path: str, directory: str, part_directories: list[str],
+                options: Optional[ConversionOptions] = None) -> None:
+    """Junta os módulos gerados para cada intervalo de livros de uma bíblia dividida.
+    Os registros são copiados na ordem dos livros, então o módulo é o mesmo de
+    uma conversão da bíblia inteira
+
+    Args:
+        path (str): Caminho da bíblia MySword
+        directory (str): Diretório de saída
+        part_directories (list[str]): Os diretórios de cada intervalo, na ordem dos livros
+        options (Optional[ConversionOptions]): Opções da conversão
+    """
+    options = options or ConversionOptions()
+    name = options.output_name or Utils.get_module_name(path)
+
+    for extension in OUTPUT_EXTENSIONS:
+        output_path = os.path.join(directory, name + extension)
+        parts = [part_path for part_path in (os.path.join(part_directory, name + extension)
+                                             for part_directory in part_directories)
+                 if os.path.exists(part_path)]
+
+        # O .cmti com o mesmo nome pertence a um comentário do lote
+        if extension == ".cmti" and options.keep_commentary:
+            continue
+
+        # Sem comentários em nenhum intervalo, o .cmti de uma conversão anterior é removido
+        if (options.build == "direct" or not parts) and os.path.exists(output_path):
+            os.remove(output_path)
+
+        if not parts:
+            continue
+
+        database = OutputDatabase(output_path, options.build, options.temp_directory)
+        connection = database.connect()
+
+        try:
+            # O primeiro intervalo traz as tabelas, os índices e a tabela Details
+            with closing(sqlite3.connect(parts[0])) as first:
+                first.backup(connection)
+
+            writer = BulkWriter(connection)
+
+            for part in parts[1:]:
+                connection.execute("ATTACH DATABASE ? AS part", (part,))
+
+                tables = [table for table, in connection.execute(
+                    "SELECT name FROM part.sqlite_master WHERE type = 'table' AND name NOT IN ('Details', 'sqlite_sequence')")]
+
+                for table in tables:
+                    # A chave inteira (ex.: data.rowid) é numerada novamente
+                    columns = ", ".join(column[1] for column in connection.execute(f'PRAGMA part.table_info("{table}")')
+                                        if not column[5])
+                    writer.execute(f'INSERT OR IGNORE INTO main."{table}" ({columns}) '
+                                   f'SELECT {columns} FROM part."{table}" ORDER BY rowid')
+
+                writer.commit()
+                connection.execute("DETACH DATABASE part")
+
+            database.publish(options.vacuum)
+        except BaseException:
+            database.discard()
+            raise
+
+
+def convert_module(path: str, directory: str, options: Optional[ConversionOptions] = None) -> BatchResult:
+    """Converte um único módulo (executado nos processos filhos)
+
+    Args:
+        path (str): Caminho do módulo MySword
+        directory (str): Diretório de saída
+        options (Optional[ConversionOptions]): Opções da conversão
+
+    Returns:
+        BatchResult: O tempo gasto e o erro, caso a conversão tenha falhado
+    """
+    options = options or ConversionOptions()
+    start = time.perf_counter()
+
+    try:
+        # Montados fora do diretório de saída, os módulos anteriores só são substituídos no final
+        if options.build == "direct":
+            remove_previous_output(path, directory, options)
+
+        # As mensagens das conversões individuais se misturariam entre os processos
+        with redirect_stdout(io.StringIO()):
+            if path.endswith(BIBLE_EXTENSION):
+                convert_bible.convert(path, directory, options)
+            else:
+                convert_commentary.convert(path, directory, options)
+    except Exception as error:
+        return BatchResult(path, time.perf_counter() - start, f"{type(error).__name__}: {error}")
+
+    return BatchResult(path, time.perf_counter() - start)
+
+
+def convert_batch(modules: list[str], directory: str, workers: int,
+                  options: Optional[ConversionOptions] = None, split: bool = False) -> list[BatchResult]:
+    """Distribui a conversão dos módulos entre os processos, começando pelos de
+    maior custo estimado (ver plan_jobs). O levantamento dos módulos (ver
+    survey_module) também é feito nos processos
+
+    Args:
+        modules (list[str]): Caminhos dos módulos MySword
+        directory (str): Diretório de saída
+        workers (int): Quantidade de processos
+        options (Optional[ConversionOptions]): Opções aplicadas a todas as conversões
+        split (bool): Se as bíblias muito grandes devem ser divididas em intervalos
+        de livros convertidos em processos diferentes
+
+    Returns:
+        list[BatchResult]: O resultado de cada módulo, na ordem em que terminaram
+    """
+    options = options or ConversionOptions()
+    results: list[BatchResult] = []
+
+    # Os intervalos de uma bíblia dividida são convertidos em diretórios temporários
+    # e juntados quando o último terminar
+    parts: dict[str, list[tuple[BatchJob, str]]] = {}
+    part_results: dict[str, list[BatchResult]] = {}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            surveys = list(executor.map(survey_module, modules))
+            jobs = plan_jobs(surveys, workers, split)
+            names = assign_output_names(surveys)
+
+            for path, name in names.items():
+                if name != Utils.get_module_name(path):
+                    print(f"Aviso: outro módulo já grava {Utils.get_module_name(path)}; {path} será gravado como {name}")
+
+            # Uma bíblia (que não é de estudos) e um comentário com o mesmo nome: o .cmti é do comentário
+            shared = shared_names(names)
+            module_options = {path: replace(options, output_name=name,
+                                            keep_commentary=path.endswith(BIBLE_EXTENSION) and name in shared)
+                              for path, name in names.items()}
+
+            for job in jobs:
+                if job.books is not None:
+                    part_directory = tempfile.mkdtemp(prefix=f"{names[job.path]}.", dir=options.temp_directory)
+                    parts.setdefault(job.path, []).append((job, part_directory))
+
+            futures = {}
+
+            for job in jobs:
+                if job.books is None:
+                    future = executor.submit(convert_module, job.path, directory, module_options[job.path])
+                else:
+                    part_directory = next(part for part_job, part in parts[job.path] if part_job is job)
+                    future = executor.submit(convert_module, job.path, part_directory,
+                                             replace(module_options[job.path], books=job.books))
+
+                futures[future] = job
+
+            for future in as_completed(futures):
+                job = futures[future]
+                result = future.result()
+
+                if job.books is not None:
+                    print(f"       {'ok' if result.error is None else 'erro':4} {result.seconds:8.2f}s  "
+                          f"{result.path} (livros {job.books[0]} a {job.books[1]})")
+
+                    part_results.setdefault(job.path, []).append(result)
+
+                    if len(part_results[job.path]) < len(parts[job.path]):
+                        continue
+
+                    result = join_parts(job.path, directory, parts.pop(job.path),
+                                        part_results.pop(job.path), module_options[job.path])
+
+                results.append(result)
+
+                status = "ok" if result.error is None else "erro"
+                print(f"[{len(results)}/{len(modules)}] {status:4} {result.seconds:8.2f}s  {result.path}")
+    finally:
+        for module_parts in parts.values():
+            for _, part_directory in module_parts:
+                shutil.rmtree(part_directory, ignore_errors=True)
+
+    return results
+
+
+def join_parts(path: str, directory: str, parts: list[tuple[BatchJob, str]],
+               part_results: list[BatchResult], options: ConversionOptions) -> BatchResult:
+    """Junta os intervalos de uma bíblia dividida (ver merge_parts) e remove os
+    diretórios temporários
+
+    Args:
+        path (str): Caminho da bíblia MySword
+        directory (str): Diretório de saída
+        parts (list[tuple[BatchJob, str]]): Cada intervalo e o seu diretório temporário
+        part_results (list[BatchResult]): O resultado da conversão de cada intervalo
+        options (ConversionOptions): Opções da conversão
+
+    Returns:
+        BatchResult: O resultado da bíblia (o tempo é a soma dos intervalos e da junção)
+    """
+    start = time.perf_counter()
+    seconds = sum(result.seconds for result in part_results)
+    errors = [result.error for result in part_results if result.error is not None]
+
+    try:
+        if errors:
+            return BatchResult(path, seconds, errors[0])
+
+        part_directories = [part_directory for _, part_directory in sorted(parts, key=lambda part: part[0].books)]
+
+        try:
+            merge_parts(path, directory, part_directories, options)
+        except Exception as error:
+            return BatchResult(path, seconds + time.perf_counter() - start, f"{type(error).__name__}: {error}")
+
+        return BatchResult(path, seconds + time.perf_counter() - start)
+    finally:
+        for _, part_directory in parts:
+            shutil.rmtree(part_directory, ignore_errors=True)
+
+
+def print_summary(results: list[BatchResult], elapsed: float, workers: int = 1) -> None:
+    """Exibe o tempo de cada módulo e o total da conversão
+
+    Args:
+        results (list[BatchResult]): Os resultados das conversões
+        elapsed (float): Tempo total decorrido, em segundos
+        workers (int): Quantidade de processos (para o tempo ideal da conversão)
+    """
+    print("#" * 80)
+    print(f"{'Tempo (s)':>10}  Módulo")
+
+    for result in sorted(results, key=lambda result: result.seconds, reverse=True):
+        print(f"{result.seconds:10.2f}  {result.path}")
+
+    failures = [result for result in results if result.error is not None]
+
+    if failures:
+        print(f"\n{len(failures)} módulo(s) com erro:")
+
+        for result in failures:
+            print(f"\t{result.path}: {result.error}")
+
+    total = sum(result.seconds for result in results)
+    print(f"\n{len(results)} módulo(s) convertido(s) em {elapsed:.2f}s (soma dos tempos: {total:.2f}s, "
+          f"ideal com {workers} processo(s): {total / workers:.2f}s)")
+
+
+def main() -> None:
+    """Converte em lote os módulos informados na linha de comando"""
+    parser = argparse.ArgumentParser(
+        description="Converte em lote bíblias e comentários MySword para o padrão e-Sword HD")
+    parser.add_argument("inputs", nargs="+",
+                        help="Diretórios ou padrões glob com arquivos .bbl.mybible e .cmt.mybible")
+    parser.add_argument("-o", "--output", default="./output",
+                        help="Diretório onde os módulos convertidos serão gravados")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Quantidade de módulos convertidos ao mesmo tempo")
+    parser.add_argument("--build", choices=OUTPUT_TARGETS, default="temp",
+                        help="Onde os módulos são montados antes de serem gravados no diretório de saída: arquivo temporário local (temp), memória (memory) ou o próprio diretório de saída (direct)")
+    parser.add_argument("--split", action="store_true",
+                        help="Divide as bíblias maiores que a parte de cada processo em intervalos de livros convertidos em processos diferentes")
+    parser.add_argument("--temp-dir",
+                        help="Diretório dos arquivos temporários de montagem (por padrão o diretório temporário do sistema)")
+    arguments = parser.parse_args()
+
+    modules = find_modules(arguments.inputs)
+
+    if not modules:
+        print("Nenhum arquivo .bbl.mybible ou .cmt.mybible foi encontrado")
+        sys.exit(-1)
+
+    os.makedirs(arguments.output, exist_ok=True)
+
+    start = time.perf_counter()
+    options = ConversionOptions(build=arguments.build, temp_directory=arguments.temp_dir)
+
+    workers = max(1, arguments.workers or 1)
+    results = convert_batch(modules, arguments.output, workers, options, arguments.split)
+    print_summary(results, time.perf_counter() - start, workers)
+
+    if any(result.error is not None for result in results):
+        sys.exit(-1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,390 +1,1317 @@
 import os
 import sys
 import sqlite3
+import time
+from collections import deque
+from contextlib import closing
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, TypeVar
 
 import text_utils
 from Utils import Utils
-from Database import Database
+from Database import BibleScan, BulkWriter, OutputDatabase, SourceDatabase
+from TransformCache import TransformCache
+from Metrics import Metrics, PhaseMetrics, SizeReport
 
-from models import BibleRow
+from constants import BATCH_SIZE, PIPELINE_QUEUE_SIZE
+from models import BibleBatch, ConversionOptions, ConversionResult
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from CommentaryAggregator import CommentaryAggregator
+    from DataStore import DataStore
+    from Manifest import Manifest
+    from Pipeline import WriterThread
 
-output_directory: str = "./output"
-"""Diretório onde ficarão armazenados os banco de dados resultantes da conversão"""
 
-input_database: sqlite3.Connection
-"""Objeto de conexão com o banco de dados de origem"""
+transform_cache: TransformCache = TransformCache()
+"""Cache das conversões de trechos repetidos entre versículos (ex.: comentários <RF><Rf>).
+É do processo, não de uma conversão: é reaproveitado pelas conversões seguintes
+feitas no mesmo processo e herdado pelos processos filhos"""
 
-output_bible_database: sqlite3.Connection
-"""O banco de dados de saída da bíblia"""
+TEXT_UTILS_FUNCTIONS: tuple[str, ...] = (
+    "extract_verse_text", "extract_verse_commentary", "get_pure_text", "get_commentaries",
+    "convert_commentary_fragment", "convert_tags", "remove_centralization",
+    "convert_strong_references", "convert_bible_references", "remove_empty_tags",
+)
+"""Funções do text_utils medidas individualmente com --metrics"""
 
-output_bible_database_path: str
-"""O caminho do banco de dados de saída da bíblia"""
+MAX_TAG_PROBLEMS = 5
+"""Quantas tags sem par são exibidas por versículo com --check-tags"""
 
-output_commentary_database: sqlite3.Connection
-"""O banco de dados de saída dos comentários"""
+ATTACH_INCOMPATIBLE_OPTIONS: tuple[str, ...] = ("incremental", "aggregate", "store_images", "check_tags", "pipeline")
+"""Opções que dependem do laço dos registros no Python e não podem ser usadas com `attach`"""
 
-output_commentary_database_path: str
-"""O caminho do banco de dados de saída dos comentários """
-
-pure_bible: list[BibleRow] = []
-"""Array com todos os registros da bíblia pura"""
-
-commentaries: list[BibleRow] = []
-"""Array com todos os registros dos comentários"""
+T = TypeVar("T")
 
 
 def print_separator() -> None:
     print("#" * 80)
 
 
-def connect_to_database(database_path: str) -> sqlite3.Connection:
-    """Abre a conexão com o banco de dados (se o banco não existir, o cria)
+def connect_to_source(database_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Abre a conexão com o banco de dados de origem, somente para leitura
 
     Args:
-        database_path (string): Caminho do banco de dados
+        database_path (string): Caminho da bíblia MySword
+        check_same_thread (bool): Se a conexão só pode ser usada pela thread que a abriu
 
     Returns:
         sqlite3.Connection: O objeto de conexão aberto
     """
-    return Database(database_path).connect()
+    return SourceDatabase(database_path).connect(check_same_thread)
 
 
-def configure_output_bible_database() -> None:
-    """Configura o banco de dados de saída da bíblia"""
+def configure_transform_cache(maxsize: int, path: Optional[str]) -> None:
+    """Recria o cache de conversões do processo se o tamanho ou o banco de
+    persistência mudaram e zera as suas estatísticas
 
-    global output_bible_database, output_bible_database_path
+    Args:
+        maxsize (int): Quantidade de comentários convertidos mantidos em cache
+        path (Optional[str]): Banco SQLite onde as conversões são guardadas
+    """
+    global transform_cache
 
-    output_bible_database = connect_to_database(output_bible_database_path)
+    if transform_cache.maxsize != maxsize or transform_cache.path != path:
+        transform_cache.close()
+        transform_cache = TransformCache(maxsize, path=path)
 
-    cursor: sqlite3.Cursor = output_bible_database.cursor()
+    transform_cache.take_statistics()
 
-    # Cria a tabela Bible
-    cursor.execute(
-        "CREATE TABLE Bible (Book INT, Chapter INT, Verse INT, Scripture BLOB_TEXT)")
 
-    # Cria a tabela Details
-    cursor.execute(
-        "CREATE TABLE Details(Title NVARCHAR(100), Abbreviation NVARCHAR(50), Information TEXT, Version INT, OldTestament BOOL, NewTestament BOOL, Apocrypha BOOL, Strongs BOOL, RightToLeft BOOL)")
+def fetch_rows(cursor: sqlite3.Cursor) -> Iterator[tuple]:
+    """Lê os registros da consulta em lotes, sem carregar a tabela inteira na memória
 
-    # Cría os índices para os campos Book, Chapter e Verse
-    cursor.execute(
-        "CREATE INDEX BookChapterVerseIndex ON Bible (Book, Chapter, Verse)")
+    Args:
+        cursor (sqlite3.Cursor): O cursor com a consulta já executada
 
-    # Popula a tabela Details
-    configure_output_bible_details()
+    Yields:
+        tuple: Cada registro lido do banco de origem
+    """
+    rows = cursor.fetchmany(BATCH_SIZE)
 
-    cursor.close()
+    while rows:
+        yield from rows
 
+        rows = cursor.fetchmany(BATCH_SIZE)
 
-def configure_commentary_database() -> None:
-    """Configura o banco de dados de saída dos comentários"""
 
-    global output_commentary_database, output_commentary_database_path
+def batched(records: Iterable[T], size: int = BATCH_SIZE) -> Iterator[list[T]]:
+    """Agrupa os registros em lotes de tamanho limitado
 
-    output_commentary_database = connect_to_database(
-        output_commentary_database_path)
+    Args:
+        records (Iterable[T]): Registros a serem agrupados
+        size (int): Tamanho máximo de cada lote
 
-    cursor: sqlite3.Cursor = output_commentary_database.cursor()
+    Yields:
+        list[T]: Lote com até `size` registros
+    """
+    iterator = iter(records)
+    batch = list(islice(iterator, size))
 
-    # Cria a tabela de comentários
-    cursor.execute(
-        "CREATE TABLE VerseCommentary (Book INT, ChapterBegin INT, VerseBegin INT, ChapterEnd INT, VerseEnd INT, Comments TEXT)")
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
 
-    # Cria a tabela Details
-    cursor.execute(
-        "CREATE TABLE Details (Title NVARCHAR(255), Abbreviation NVARCHAR(50), Information TEXT, Version INT)")
 
-    # Cría os índices para os campos Book, ChapterBegin e VerseBegin
-    cursor.execute(
-        "CREATE INDEX BookChapterVerseIndex ON VerseCommentary (Book, ChapterBegin, VerseBegin)")
+def group_by_book(rows: Iterable[tuple]) -> Iterator[list[tuple]]:
+    """Agrupa os registros da tabela Bible (já ordenados) por livro
 
-    # Popula a tabela Details
-    configure_output_commentary_details()
+    Args:
+        rows (Iterable[tuple]): Registros ordenados por Book, Chapter e Verse
 
+    Yields:
+        list[tuple]: Todos os registros de um livro
+    """
+    for _, book_rows in groupby(rows, key=itemgetter(0)):
+        yield list(book_rows)
 
-def configure_output_bible_details() -> None:
-    """Configura a tabela Details do banco de dados da bíblia"""
 
-    global input_database, output_bible_database
+def transform_rows(batch: BibleBatch) -> tuple[BibleBatch, BibleBatch]:
+    """Converte um lote de registros da tabela Bible.
+    Não depende do estado da conversão, então pode ser executada nos processos filhos
 
-    sql_get_details = "SELECT * FROM Details LIMIT 1"
+    Args:
+        batch (BibleBatch): Registros trazidos do banco de origem
 
-    input_cursor: sqlite3.Cursor = input_database.execute(sql_get_details)
-    output_cursor: sqlite3.Cursor = output_bible_database.cursor()
+    Returns:
+        tuple[BibleBatch, BibleBatch]: Os versículos e os comentários convertidos
+    """
+    pure_bible = BibleBatch()
+    commentaries = BibleBatch()
 
-    result = input_cursor.fetchone()
+    for book, chapter, verse, scripture in batch:
+        commentary = extract_commentaries(scripture)
 
-    data = dict(zip([column[0].lower()
-                     for column in input_cursor.description], result))
+        if commentary is not None:
+            commentaries.append(book, chapter, verse, commentary)
 
-    title = data.get("description", data.get("comments", ""))
-    abbreviation = data.get("abbreviation", "")
-    information = data.get("comments", data.get("description", ""))
-    oldtestament = data.get("ot", False)
-    newtestament = data.get("nt", False)
-    strongs = data.get("strong", False)
-    version = 4
-    apocrypha = 0
-    righttoleft = data.get("righttoleft", False)
+        pure_bible.append(book, chapter, verse, extract_pure_text(scripture))
 
-    details = {
-        'title': title,
-        'abbreviation': abbreviation,
-        'information': information,
-        'version': version,
-        'oldtestament': oldtestament,
-        'newtestament': newtestament,
-        'apocrypha': apocrypha,
-        'strongs': strongs,
-        'righttoleft': righttoleft
-    }
+    transform_cache.flush()
 
-    output_sql = "INSERT INTO Details VALUES (:title, :abbreviation, :information, :version, :oldtestament, :newtestament, :apocrypha, :strongs, :righttoleft)"
+    return pure_bible, commentaries
 
-    output_cursor.execute(output_sql, details)
 
-    if output_cursor.connection.in_transaction:
-        output_cursor.execute("COMMIT")
+def transform_rows_in_worker(batch: BibleBatch) -> tuple[tuple[BibleBatch, BibleBatch], dict[str, int]]:
+    """Converte um lote de registros num processo filho, devolvendo também as
+    estatísticas do cache de conversões desse processo
 
-    input_cursor.close()
-    output_cursor.close()
+    Args:
+        batch (BibleBatch): Registros trazidos do banco de origem
 
+    Returns:
+        tuple[tuple[BibleBatch, BibleBatch], dict[str, int]]: O resultado de
+        transform_rows e as estatísticas do cache
+    """
+    return transform_rows(batch), transform_cache.take_statistics()
 
-def configure_output_commentary_details() -> None:
-    """Configura a tabela Details do banco de dados de comentários"""
 
-    global input_database, output_commentary_database
+def extract_pure_text(scripture: str) -> str:
+    """Extrai o texto puro do versículo
 
-    sql_get_details: str = "SELECT * FROM Details LIMIT 1"
+    Args:
+        scripture (str): Texto do versículo trazido do banco de origem
 
-    input_cursor: sqlite3.Cursor = input_database.execute(sql_get_details)
-    output_cursor: sqlite3.Cursor = output_commentary_database.cursor()
+    Returns:
+        str: O texto tratado
+    """
 
-    result = input_cursor.fetchone()
+    return text_utils.extract_verse_text(scripture)
 
-    data = dict(zip([column[0].lower()
-                for column in input_cursor.description], result))
 
-    title = data.get("description", data.get("comments", ""))
-    abbreviation = data.get("abbreviation", "")
-    information = data.get("comments", data.get("description", ""))
-    version = 4
+def extract_commentaries(scripture: str) -> Optional[str]:
+    """Extrai somente o comentário do versículo
 
-    details = {
-        'title': title,
-        'abbreviation': abbreviation,
-        'information': information,
-        'version': version,
-    }
+    Args:
+        scripture (str): Texto do versículo trazido do banco de origem
 
-    output_sql = "INSERT INTO Details VALUES (:title, :abbreviation, :information, :version)"
+    Returns:
+        Optional[str]: O comentário tratado ou None se o versículo não tiver comentários
+    """
 
-    output_cursor.execute(output_sql, details)
+    return text_utils.extract_verse_commentary(scripture, convert_commentary_fragment)
 
-    if output_cursor.connection.in_transaction:
-        output_cursor.execute("COMMIT")
 
-    input_cursor.close()
-    output_cursor.close()
+def convert_commentary_fragment(fragment: str) -> str:
+    """Converte um único comentário (<RF><Rf>), consultando o cache de conversões
 
+    Args:
+        fragment (str): Conteúdo do comentário
 
-def create_output_directory() -> None:
-    """Cria o diretório de saída para os módulos"""
-    global output_directory
+    Returns:
+        str: Comentário convertido
+    """
 
-    output_directory = Utils.create_output_directory()
+    return transform_cache.get("commentary", fragment, text_utils.convert_commentary_fragment)
 
 
-def is_study_bible(cursor: sqlite3.Cursor) -> bool:
-    """Checa se a bíblia é de estudos
+def attach_conflicts(options: ConversionOptions) -> list[str]:
+    """Retorna as opções ligadas que não podem ser usadas com a conversão dentro do SQLite
 
     Args:
-        cursor (sqlite3.Cursor): O cursor que será usado para a verificação
+        options (ConversionOptions): Opções da conversão
 
     Returns:
-        bool: Verdadeiro ou falso
+        list[str]: Os nomes das opções (vazia se não houver conflito ou sem a opção `attach`)
     """
-    cursor.execute(
-        "SELECT True FROM Bible WHERE Scripture LIKE '%<RF%' LIMIT 1")
+    if not options.attach:
+        return []
 
-    return cursor.fetchone() is not None
+    conflicts = [name for name in ATTACH_INCOMPATIBLE_OPTIONS if getattr(options, name)]
 
+    if options.jobs > 1:
+        conflicts.append("jobs")
 
-def process_raw_database() -> None:
-    """Faz a conversão pura do banco de dados de origem para o destino"""
+    return conflicts
 
-    global input_database, output_bible_database
 
-    reading_cursor: sqlite3.Cursor = input_database.cursor()
+def print_cache_statistics() -> None:
+    """Exibe o aproveitamento do cache de conversões"""
 
-    reading_cursor.execute(
-        "SELECT * FROM Bible ORDER BY Book, Chapter, Verse, Scripture")
+    statistics = transform_cache.statistics()
+    lookups = statistics["hits"] + statistics["persistent_hits"] + statistics["misses"]
 
-    row = reading_cursor.fetchone()
+    if not lookups:
+        return
 
-    while row is not None:
-        record = BibleRow(*row)
+    reused = statistics["hits"] + statistics["persistent_hits"]
+    print(f"Cache de conversões: {reused} de {lookups} comentários reaproveitados "
+          f"({statistics['persistent_hits']} lidos do banco de cache).")
 
-        text = record.scripture
 
-        text = text_utils.convert_tags(text)
-        text = text_utils.remove_centralization(text)
-        text = text_utils.convert_strong_references(text)
-        text = text_utils.remove_empty_tags(text)
+def print_study_bible_notice() -> None:
+    """Avisa que a bíblia é de estudos e que os comentários irão para um módulo separado"""
 
-        record.scripture = text
+    print_separator()
+    print("""
+Esta é uma bíblia de estudos.
+O aplicativo e-Sword HD não aceita bíblia de estudos, então:
+- Os versículos serão tratados e exportados para um arquivo com extensão .bbli (extensão de bíblias no padrão e-Sword HD);
+- Os comentários serão tratados e exportados para um arquivo com extensão .cmti (extensão de comentários no padrão e-Sword HD).\n""")
+    print_separator()
+    print()
 
-        pure_bible.append(record)
-        row = reading_cursor.fetchone()
 
+class BibleConverter:
+    """Conversão de uma bíblia MySword. Guarda o estado da conversão (conexões,
+    gravadores e manifestos), então várias conversões podem ser feitas no mesmo
+    processo, uma após a outra. O cache de conversões (transform_cache) e a
+    medição das funções do text_utils são do processo: conversões simultâneas
+    devem ser feitas em processos diferentes (como em convert_batch)
+    """
 
-def save_pure_bible() -> None:
-    """Salva os versículos na bíblia de saída"""
+    def __init__(self, input_path: str, directory: str,
+                 options: Optional[ConversionOptions] = None, metrics: Optional[Metrics] = None) -> None:
+        """
+        Args:
+            input_path (str): Caminho da bíblia MySword
+            directory (str): Diretório (já existente) onde os módulos serão gravados
+            options (Optional[ConversionOptions]): Opções da conversão
+            metrics (Optional[Metrics]): Medições de cada etapa (desligadas por padrão)
+        """
+        self.options = options or ConversionOptions()
+        self.metrics = metrics or Metrics()
+
+        conflicts = attach_conflicts(self.options)
+
+        if conflicts:
+            raise ValueError(f"Opções incompatíveis com a conversão dentro do SQLite (attach): {', '.join(conflicts)}")
+
+        if self.options.books is not None and self.options.incremental:
+            raise ValueError("O modo incremental converte sempre a bíblia inteira (books)")
+
+        filename = self.options.output_name or Utils.get_module_name(input_path)
+
+        self.input_database_path = input_path
+        self.output_directory = directory
+        self.output_bible_database_path = os.path.join(directory, f"{filename}.bbli")
+        self.output_commentary_database_path = os.path.join(directory, f"{filename}.cmti")
+        self.manifest_path = os.path.join(directory, f"{filename}.manifest.json")
+
+        self.input_database: Optional[sqlite3.Connection] = None
+        self.output_bible_database: Optional[OutputDatabase] = None
+        self.output_bible_writer: Optional[BulkWriter] = None
+        self.output_commentary_database: Optional[OutputDatabase] = None
+        self.output_commentary_writer: Optional[BulkWriter] = None
+        """None enquanto não houver comentários"""
+        self.chapter_commentary_table: bool = False
+        """Se o banco de comentários tem as tabelas ChapterCommentary e BookCommentary"""
+        self.commentary_aggregator: Optional['CommentaryAggregator'] = None
+        """Agrupamento dos comentários (somente com a opção `aggregate`)"""
+        self.aggregated_rows: int = 0
+        """Quantidade de registros gravados pelo agrupamento dos comentários"""
+        self.data_store: Optional['DataStore'] = None
+        """Gravação das imagens dos comentários na tabela data (somente com a opção `store_images`)"""
+        self.size_report: Optional[SizeReport] = SizeReport() if self.options.minify else None
+        """Bytes economizados pela minificação (somente com a opção `minify`)"""
+        self.malformed_rows: int = 0
+        """Quantidade de versículos com tags MySword sem par (somente com a opção `check_tags`)"""
+
+        self.scan: Optional[BibleScan] = None
+        """A ordem de leitura da tabela Bible do módulo de origem"""
+        self.writer_threads: Optional[dict[str, 'WriterThread']] = None
+        """Threads de gravação de cada banco de saída ("bible" e "commentary"), somente
+        enquanto os registros são convertidos com a opção `pipeline`"""
+
+        self.previous_manifest: Optional['Manifest'] = None
+        """O manifesto da conversão anterior, quando os módulos existentes estão sendo atualizados"""
+        self.current_manifest: Optional['Manifest'] = None
+        """O manifesto da conversão atual (somente no modo incremental)"""
+
+    def connect_to_database(self, database_path: str, existing: bool = False) -> OutputDatabase:
+        """Abre o banco de dados de saída, montado conforme a opção `build`
+
+        Args:
+            database_path (string): Caminho final do banco de dados
+            existing (bool): Se o módulo já existente deve ser aberto para atualização
+
+        Returns:
+            OutputDatabase: O banco de dados de saída, já conectado
+        """
+        database = OutputDatabase(database_path, self.options.build, self.options.temp_directory,
+                                  self.options.page_size)
+        database.connect(existing)
+
+        if self.options.attach:
+            database.attach_source(self.input_database_path)
+            self.register_functions(database.connection)
+
+        return database
+
+    def register_functions(self, connection: sqlite3.Connection) -> None:
+        """Registra as conversões dos versículos como funções SQL determinísticas,
+        usadas pelo INSERT ... SELECT da opção `attach`
+
+        Args:
+            connection (sqlite3.Connection): Conexão com o banco de saída
+        """
+        connection.create_function("esword_verse", 1, extract_pure_text, deterministic=True)
+        connection.create_function("esword_commentary", 1, extract_commentaries, deterministic=True)
+
+        if self.size_report is not None:
+            connection.create_function("esword_minify", 2, self.minify_text, deterministic=True)
+
+    def configure_output_bible_database(self) -> None:
+        """Configura o banco de dados de saída da bíblia"""
+
+        updating: bool = self.previous_manifest is not None
+
+        self.output_bible_database = self.connect_to_database(self.output_bible_database_path, updating)
+
+        if updating:
+            """Atualização de um módulo existente: somente a tabela Details é refeita"""
+            self.output_bible_writer = BulkWriter(self.output_bible_database.connection,
+                                                  durable=self.output_bible_database.in_place)
+            self.output_bible_writer.execute("DELETE FROM Details")
+            self.configure_output_bible_details()
+            return
 
-    writing_cursor: sqlite3.Cursor = output_bible_database.cursor()
+        self.output_bible_writer = BulkWriter(self.output_bible_database.connection)
 
-    if not writing_cursor.connection.in_transaction:
-        writing_cursor.execute("BEGIN")
+        cursor: sqlite3.Cursor = self.output_bible_database.connection.cursor()
 
-    for record in pure_bible:
-        writing_cursor.execute("INSERT INTO Bible (Book, Chapter, Verse, Scripture) VALUES (?, ?, ?, ?)",
-                               (record.book, record.chapter, record.verse, record.scripture))
+        # Cria a tabela Bible
+        cursor.execute(
+            "CREATE TABLE Bible (Book INT, Chapter INT, Verse INT, Scripture BLOB_TEXT)")
 
-    if writing_cursor.connection.in_transaction:
-        writing_cursor.execute("COMMIT")
+        # Cria a tabela Details
+        cursor.execute(
+            "CREATE TABLE Details(Title NVARCHAR(100), Abbreviation NVARCHAR(50), Information TEXT, Version INT, OldTestament BOOL, NewTestament BOOL, Apocrypha BOOL, Strongs BOOL, RightToLeft BOOL)")
 
-    writing_cursor.execute("VACUUM")
-    writing_cursor.close()
+        # Cría os índices para os campos Book, Chapter e Verse (depois da gravação dos versículos)
+        self.output_bible_writer.defer_index(
+            "CREATE INDEX BookChapterVerseIndex ON Bible (Book, Chapter, Verse)")
 
+        # Popula a tabela Details
+        self.configure_output_bible_details()
 
-def save_commentaries() -> None:
-    """Salva os comentários"""
+        cursor.close()
 
-    writing_cursor: sqlite3.Cursor = output_commentary_database.cursor()
+    def configure_commentary_database(self) -> None:
+        """Configura o banco de dados de saída dos comentários"""
 
-    if not writing_cursor.connection.in_transaction:
-        writing_cursor.execute("BEGIN")
+        updating: bool = self.previous_manifest is not None and os.path.exists(
+            self.output_commentary_database_path)
 
-    for record in commentaries:
-        writing_cursor.execute("""INSERT INTO VerseCommentary (Book, ChapterBegin, VerseBegin, ChapterEnd, VerseEnd, Comments) VALUES (?, ?, ?, ?, ?, ?)""",
-                               (record.book, record.chapter, record.verse, record.chapter, record.verse, record.scripture))
+        self.output_commentary_database = self.connect_to_database(
+            self.output_commentary_database_path, updating)
 
-    if writing_cursor.connection.in_transaction:
-        writing_cursor.execute("COMMIT")
+        if updating:
+            """Atualização de um módulo existente: somente a tabela Details é refeita"""
+            self.output_commentary_writer = BulkWriter(self.output_commentary_database.connection,
+                                                       durable=self.output_commentary_database.in_place)
+            self.output_commentary_writer.execute("DELETE FROM Details")
+            self.configure_output_commentary_details()
 
-    writing_cursor.execute("VACUUM")
-    writing_cursor.close()
+            if self.options.aggregate:
+                self.create_aggregated_commentary_tables()
+            else:
+                self.chapter_commentary_table = self.output_commentary_database.connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ChapterCommentary'").fetchone() is not None
 
+            if self.options.store_images:
+                self.create_data_table()
+            return
 
-def extract_pure_text(record: BibleRow) -> None:
-    """Extrai o texto puro e o adiciona ao array 'pure_text'
+        self.output_commentary_writer = BulkWriter(self.output_commentary_database.connection)
 
-    Args:
-        record (Record): O registro trazido do banco de origem
-    """
+        cursor: sqlite3.Cursor = self.output_commentary_database.connection.cursor()
 
-    global pure_bible
+        # Cria a tabela de comentários
+        cursor.execute(
+            "CREATE TABLE VerseCommentary (Book INT, ChapterBegin INT, VerseBegin INT, ChapterEnd INT, VerseEnd INT, Comments TEXT)")
 
-    text = record.scripture
+        # Cria a tabela Details
+        cursor.execute(
+            "CREATE TABLE Details (Title NVARCHAR(255), Abbreviation NVARCHAR(50), Information TEXT, Version INT)")
 
-    text = text_utils.get_pure_text(text)
-    text = text_utils.remove_centralization(text)
-    text = text_utils.convert_tags(text)
-    text = text_utils.convert_strong_references(text)
-    text = text_utils.remove_empty_tags(text)
+        # Cría os índices para os campos Book, ChapterBegin e VerseBegin (depois da gravação dos comentários)
+        self.output_commentary_writer.defer_index(
+            "CREATE INDEX BookChapterVerseIndex ON VerseCommentary (Book, ChapterBegin, VerseBegin)")
 
-    record.scripture = text
-    pure_bible.append(record)
+        # Popula a tabela Details
+        self.configure_output_commentary_details()
 
+        if self.options.aggregate:
+            self.create_aggregated_commentary_tables()
 
-def extract_commentaries(record: BibleRow) -> None:
-    """Extrai somente o comentário do versículo
+        if self.options.store_images:
+            self.create_data_table()
 
-    Args:
-        record (Record): O registro trazido do banco de origem
-    """
-    global commentaries
+        cursor.close()
 
-    text = record.scripture
+    def create_aggregated_commentary_tables(self) -> None:
+        """Cria no banco de comentários as tabelas dos comentários promovidos a
+        comentários do capítulo ou do livro (ver CommentaryAggregator)"""
 
-    if '<RF' not in text:
-        return
+        self.output_commentary_writer.execute(
+            "CREATE TABLE IF NOT EXISTS BookCommentary (Book INT, Comments TEXT)")
+        self.output_commentary_writer.execute(
+            "CREATE TABLE IF NOT EXISTS ChapterCommentary (Book INT, Chapter INT, Comments TEXT)")
 
-    text = text_utils.get_commentaries(text)
-    text = text_utils.convert_strong_references(text)
-    text = text_utils.convert_bible_references(text)
+        self.output_commentary_writer.defer_index(
+            "CREATE INDEX IF NOT EXISTS BookIndex ON BookCommentary (Book)")
+        self.output_commentary_writer.defer_index(
+            "CREATE INDEX IF NOT EXISTS BookChapterIndex ON ChapterCommentary (Book, Chapter)")
 
-    record.scripture = text
+        self.chapter_commentary_table = True
 
-    commentaries.append(record)
+    def create_data_table(self) -> None:
+        """Cria no banco de comentários a tabela `data`, onde ficam as imagens (ver DataStore)"""
+        from DataStore import DataStore
 
+        self.output_commentary_writer.execute(
+            "CREATE TABLE IF NOT EXISTS data(rowid INTEGER primary key autoincrement, id TEXT collate nocase, filename TEXT, content BLOB)")
+        self.output_commentary_writer.defer_index(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_data_id on data(id)")
 
-def convert_bible() -> None:
-    """Gerencia a conversão da bíblia"""
-    global input_database_path, input_database, output_bible_database
+        self.data_store = DataStore(self.output_commentary_writer)
 
-    with connect_to_database(input_database_path) as input_database:
-        cursor: sqlite3.Cursor = input_database.cursor()
+    def configure_output_bible_details(self) -> None:
+        """Configura a tabela Details do banco de dados da bíblia"""
 
-        process_commentaries: bool = is_study_bible(cursor)
+        sql_get_details = "SELECT * FROM Details LIMIT 1"
 
-        cursor.execute(
-            "SELECT * FROM Bible ORDER BY Book, Chapter, Verse, Scripture")
+        input_cursor: sqlite3.Cursor = self.input_database.execute(sql_get_details)
+        output_cursor: sqlite3.Cursor = self.output_bible_database.connection.cursor()
+
+        result = input_cursor.fetchone()
+
+        data = dict(zip([column[0].lower()
+                         for column in input_cursor.description], result))
+
+        title = data.get("description", data.get("comments", ""))
+        abbreviation = data.get("abbreviation", "")
+        information = data.get("comments", data.get("description", ""))
+        oldtestament = data.get("ot", False)
+        newtestament = data.get("nt", False)
+        strongs = data.get("strong", False)
+        version = 4
+        apocrypha = 0
+        righttoleft = data.get("righttoleft", False)
+
+        details = {
+            'title': title,
+            'abbreviation': abbreviation,
+            'information': information,
+            'version': version,
+            'oldtestament': oldtestament,
+            'newtestament': newtestament,
+            'apocrypha': apocrypha,
+            'strongs': strongs,
+            'righttoleft': righttoleft
+        }
 
-        configure_output_bible_database()
+        output_sql = "INSERT INTO Details VALUES (:title, :abbreviation, :information, :version, :oldtestament, :newtestament, :apocrypha, :strongs, :righttoleft)"
 
-        if not process_commentaries:
-            """Só irá processar os comentários se for uma bíblia de estudos"""
-            print("Não é uma bíblia de estudos - extraindo somente o texto tratado.")
-            process_raw_database()
-            save_pure_bible()
+        output_cursor.execute(output_sql, details)
+
+        if output_cursor.connection.in_transaction:
+            output_cursor.execute("COMMIT")
+
+        input_cursor.close()
+        output_cursor.close()
+
+    def configure_output_commentary_details(self) -> None:
+        """Configura a tabela Details do banco de dados de comentários"""
+
+        sql_get_details: str = "SELECT * FROM Details LIMIT 1"
+
+        input_cursor: sqlite3.Cursor = self.input_database.execute(sql_get_details)
+        output_cursor: sqlite3.Cursor = self.output_commentary_database.connection.cursor()
+
+        result = input_cursor.fetchone()
+
+        data = dict(zip([column[0].lower()
+                    for column in input_cursor.description], result))
+
+        title = data.get("description", data.get("comments", ""))
+        abbreviation = data.get("abbreviation", "")
+        information = data.get("comments", data.get("description", ""))
+        version = 4
+
+        details = {
+            'title': title,
+            'abbreviation': abbreviation,
+            'information': information,
+            'version': version,
+        }
+
+        output_sql = "INSERT INTO Details VALUES (:title, :abbreviation, :information, :version)"
+
+        output_cursor.execute(output_sql, details)
+
+        if output_cursor.connection.in_transaction:
+            output_cursor.execute("COMMIT")
+
+        input_cursor.close()
+        output_cursor.close()
+
+    def select_changed_chapters(self, rows: Iterable[tuple]) -> Iterator[list[tuple]]:
+        """Agrupa os registros por capítulo, registra o resumo de cada capítulo no
+        manifesto atual e devolve somente os capítulos que mudaram desde a conversão anterior
+
+        Args:
+            rows (Iterable[tuple]): Registros ordenados por Book, Chapter e Verse
+
+        Yields:
+            list[tuple]: Todos os registros de um capítulo alterado (ou novo)
+        """
+        from Manifest import Manifest
+
+        for (book, chapter), chapter_rows in groupby(rows, key=itemgetter(0, 1)):
+            chapter_rows = list(chapter_rows)
+
+            key = Manifest.key(book, chapter)
+            digest = Manifest.digest(chapter_rows)
+            self.current_manifest.chapters[key] = digest
+
+            if self.previous_manifest is None or self.previous_manifest.chapters.get(key) != digest:
+                yield chapter_rows
+
+    def delete_chapters(self, chapters: Iterable[tuple[int, int]]) -> None:
+        """Remove dos módulos existentes os versículos e comentários dos capítulos informados
+
+        Args:
+            chapters (Iterable[tuple[int, int]]): Pares (livro, capítulo)
+        """
+        for book, chapter in chapters:
+            self.submit("bible", self.output_bible_writer.execute,
+                        "DELETE FROM Bible WHERE Book = ? AND Chapter = ?", (book, chapter))
+
+            if self.output_commentary_writer is not None:
+                self.submit("commentary", self.output_commentary_writer.execute,
+                            "DELETE FROM VerseCommentary WHERE Book = ? AND ChapterBegin = ?", (book, chapter))
+
+            if self.chapter_commentary_table:
+                self.submit("commentary", self.output_commentary_writer.execute,
+                            "DELETE FROM ChapterCommentary WHERE Book = ? AND Chapter = ?", (book, chapter))
+
+    def transform_chunks(self, chunks: Iterable[list[tuple]]) -> Iterator[tuple[BibleBatch, BibleBatch]]:
+        """Converte os blocos de registros, em paralelo quando a opção `jobs` for maior que 1.
+        Os resultados são devolvidos na mesma ordem dos blocos de entrada
+
+        Args:
+            chunks (Iterable[list[tuple]]): Blocos de registros ordenados
+
+        Yields:
+            tuple[BibleBatch, BibleBatch]: Os versículos e os comentários de cada bloco
+        """
+        jobs = self.options.jobs
+
+        if jobs <= 1:
+            for chunk in chunks:
+                yield transform_rows(BibleBatch.from_rows(chunk))
             return
 
-        configure_commentary_database()
-        print_separator()
-        print("""
-Esta é uma bíblia de estudos.
-O aplicativo e-Sword HD não aceita bíblia de estudos, então:
-- Os versículos serão tratados e exportados para um arquivo com extensão .bbli (extensão de bíblias no padrão e-Sword HD);
-- Os comentários serão tratados e exportados para um arquivo com extensão .cmti (extensão de comentários no padrão e-Sword HD).\n""")
-        print_separator()
-        print()
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending: deque['Future'] = deque()
+
+            def next_result() -> tuple[BibleBatch, BibleBatch]:
+                result, statistics = pending.popleft().result()
+                transform_cache.add_statistics(statistics)
+                return result
+
+            for chunk in chunks:
+                pending.append(executor.submit(transform_rows_in_worker, BibleBatch.from_rows(chunk)))
+
+                # Limita a quantidade de blocos em memória aguardando gravação
+                if len(pending) >= jobs * 2:
+                    yield next_result()
+
+            while pending:
+                yield next_result()
+
+    def submit(self, output: str, function: Callable[..., object], *args: object) -> None:
+        """Executa uma gravação num banco de saída: diretamente ou, com a opção
+        `pipeline`, na thread de gravação desse banco
 
-        row = cursor.fetchone()
-        print("Extraindo versículos e comentários...")
+        Args:
+            output (str): O banco de saída ("bible" ou "commentary")
+            function (Callable[..., object]): A função que grava
+            *args (object): Os argumentos da função
+        """
+        if self.writer_threads is None:
+            function(*args)
+            return
+
+        thread = self.writer_threads.get(output)
+
+        if thread is None:
+            from Pipeline import WriterThread
+
+            thread = self.writer_threads[output] = WriterThread(PIPELINE_QUEUE_SIZE, name=f"gravação ({output})")
+
+        thread.submit(function, *args)
+
+    def close_writer_threads(self) -> None:
+        """Aguarda as gravações pendentes e encerra as threads de gravação,
+        relançando o primeiro erro de gravação"""
 
-        while row is not None:
+        threads, self.writer_threads = self.writer_threads or {}, None
+        error: Optional[BaseException] = None
+
+        for thread in threads.values():
+            try:
+                thread.close()
+            except BaseException as thread_error:
+                error = error or thread_error
+
+        if error is not None:
+            raise error
+
+    def process_database(self, cursor: sqlite3.Cursor) -> None:
+        """Converte todos os registros da consulta e os grava nos bancos de saída.
+        O banco de comentários só é criado quando o primeiro comentário (<RF>) aparece.
+
+        Com a opção `pipeline`, a leitura e a gravação de cada banco de saída são
+        feitas em threads separadas, ligadas à conversão por filas limitadas: a
+        leitura e as gravações (que liberam o GIL) acontecem enquanto os lotes são
+        convertidos, e a bíblia e os comentários são gravados ao mesmo tempo
+
+        Args:
+            cursor (sqlite3.Cursor): O cursor com a consulta ordenada da tabela Bible
+            (com a opção `pipeline`, de uma conexão que possa ser usada por outra thread)
+        """
+        if not self.options.pipeline:
+            self.convert_rows(cursor)
+            return
 
-            extract_pure_text(BibleRow(*row))
-            extract_commentaries(BibleRow(*row))
+        self.writer_threads = {}
 
-            row = cursor.fetchone()
+        try:
+            self.convert_rows(cursor)
+        except BaseException:
+            # O erro da conversão prevalece sobre um erro de gravação
+            try:
+                self.close_writer_threads()
+            except BaseException:
+                pass
+            raise
 
-        print("Feito!\n")
-        save_pure_bible()
-        save_commentaries()
+        with self.metrics.phase("wait_writers"):
+            self.close_writer_threads()
 
+    def convert_rows(self, cursor: sqlite3.Cursor) -> None:
+        """Converte os registros da consulta e envia os lotes convertidos para a
+        gravação (ver process_database)
 
-if len(sys.argv) < 2:
-    print(
-        f"Use:\n\tpython {os.path.basename(__file__)} <Caminho da bíblia MyBible>")
-    sys.exit(-1)
+        Args:
+            cursor (sqlite3.Cursor): O cursor com a consulta ordenada da tabela Bible
+        """
+        metrics = self.metrics
 
-input_database_path = sys.argv[1]
-if not os.path.exists(input_database_path):
-    print(f"O arquivo '{input_database_path}' não foi encontrado")
-    sys.exit(-1)
+        with metrics.phase("row_loop") as loop:
+            rows = fetch_rows(cursor)
 
-create_output_directory()
-filename = os.path.splitext(input_database_path)[0].split('.')[0]
-if not filename:
-    print("O nome do arquivo não possui a extensão .bbl.mybible")
-    sys.exit(-1)
+            if loop is not None:
+                rows = self.count_rows(rows, loop)
 
-output_bible_database_path = os.path.join(output_directory, f"{filename}.bbli")
-output_commentary_database_path = os.path.join(
-    output_directory, f"{filename}.cmti")
+            if self.options.check_tags:
+                rows = self.check_tags(rows)
 
-convert_bible()
-print(f"Os arquivos convertidos estão na pasta {output_directory}")
+            if self.options.incremental:
+                chunks = self.select_changed_chapters(rows)
+            else:
+                chunks = group_by_book(rows) if self.options.jobs > 1 else batched(rows)
+
+            if not self.options.pipeline:
+                self.convert_chunks(chunks)
+                return
+
+            from Pipeline import ReaderThread
+
+            with ReaderThread(chunks, PIPELINE_QUEUE_SIZE) as reader:
+                self.convert_chunks(reader)
+
+    def convert_chunks(self, chunks: Iterable[list[tuple]]) -> None:
+        """Converte os blocos de registros e envia os lotes convertidos para a gravação
+
+        Args:
+            chunks (Iterable[list[tuple]]): Blocos de registros ordenados
+        """
+        for pure_bible, commentaries in self.transform_chunks(chunks):
+            if self.previous_manifest is not None:
+                self.delete_chapters(dict.fromkeys(pure_bible.chapter_keys()))
+
+            if self.size_report is not None:
+                with self.metrics.phase("minify", len(pure_bible) + len(commentaries)):
+                    pure_bible.texts = self.minify_texts("Bible", pure_bible.texts)
+                    commentaries.texts = self.minify_texts("VerseCommentary", commentaries.texts)
+
+            self.submit("bible", self.save_pure_bible, pure_bible)
+
+            # Os versículos sem comentários também passam pelo agrupamento: são
+            # eles que dizem onde cada capítulo termina
+            if self.commentary_aggregator is not None:
+                with self.metrics.phase("aggregate_commentaries", len(commentaries)):
+                    self.commentary_aggregator.add(pure_bible, commentaries)
+
+            if not commentaries and self.commentary_aggregator is None:
+                continue
+
+            if commentaries and self.output_commentary_writer is None:
+                with self.metrics.phase("configure_commentary_database"):
+                    self.configure_commentary_database()
+
+                print_study_bible_notice()
+
+            if self.commentary_aggregator is not None:
+                self.save_aggregated_commentaries()
+                continue
+
+            self.submit("commentary", self.save_commentaries, commentaries)
+
+        if self.commentary_aggregator is not None:
+            self.commentary_aggregator.finish()
+            self.save_aggregated_commentaries()
+
+    def book_condition(self, condition: Optional[str] = None) -> Optional[str]:
+        """Acrescenta à condição da leitura o intervalo de livros da opção `books`
+
+        Args:
+            condition (Optional[str]): Outra condição dos registros lidos
+
+        Returns:
+            Optional[str]: A condição completa (None se não houver nenhuma)
+        """
+        if self.options.books is None:
+            return condition
+
+        first, last = self.options.books
+        books = f"Book BETWEEN {int(first)} AND {int(last)}"
+
+        return books if condition is None else f"{books} AND {condition}"
+
+    def process_attached_database(self) -> None:
+        """Converte e grava todos os registros dentro do SQLite: o módulo de origem está
+        anexado aos bancos de saída (ver connect_to_database) e cada tabela é gravada
+        por um único INSERT ... SELECT que chama as funções registradas, sem que os
+        registros passem pelo laço do Python. A ordem de gravação é a mesma de process_database
+        """
+        metrics = self.metrics
+
+        scripture = self.minified_column("Bible", "esword_verse(Scripture)")
+        self.scan.prepare(self.output_bible_database.connection)
+
+        with metrics.phase("save_pure_bible") as phase:
+            cursor = self.output_bible_writer.execute(
+                "INSERT INTO Bible (Book, Chapter, Verse, Scripture) " +
+                self.scan.query(f"Book, Chapter, Verse, {scripture}", "source", self.book_condition()))
+
+            if phase is not None:
+                phase.rows += cursor.rowcount
+
+        # extract_commentaries só devolve um comentário quando o versículo tem <RF
+        commentary_condition = self.book_condition("instr(Scripture, '<RF') > 0")
+
+        if self.input_database.execute(f"SELECT 1 FROM Bible WHERE {commentary_condition} LIMIT 1").fetchone() is None:
+            transform_cache.flush()
+            return
+
+        with metrics.phase("configure_commentary_database"):
+            self.configure_commentary_database()
+
+        print_study_bible_notice()
+
+        comments = self.minified_column("VerseCommentary", "esword_commentary(Scripture)")
+        self.scan.prepare(self.output_commentary_database.connection)
+
+        with metrics.phase("save_commentaries") as phase:
+            cursor = self.output_commentary_writer.execute(
+                "INSERT INTO VerseCommentary (Book, ChapterBegin, VerseBegin, ChapterEnd, VerseEnd, Comments) " +
+                self.scan.query(f"Book, Chapter, Verse, Chapter, Verse, {comments}", "source",
+                                where=commentary_condition))
+
+            if phase is not None:
+                phase.rows += cursor.rowcount
+
+        transform_cache.flush()
+
+    def minified_column(self, table: str, expression: str) -> str:
+        """Envolve a expressão SQL do texto convertido na minificação, se ela foi pedida
+
+        Args:
+            table (str): A tabela onde o texto será gravado
+            expression (str): A expressão que converte o texto
+
+        Returns:
+            str: A expressão a ser usada no INSERT ... SELECT
+        """
+        if self.size_report is None:
+            return expression
+
+        return f"esword_minify('{table}', {expression})"
+
+    def minify_text(self, table: str, text: str) -> str:
+        """Reduz o HTML de um único texto (função SQL esword_minify da opção `attach`)
+
+        Args:
+            table (str): A tabela onde o texto será gravado
+            text (str): O texto já convertido
+
+        Returns:
+            str: O texto reduzido
+        """
+        return self.minify_texts(table, [text])[0]
+
+    def check_tags(self, rows: Iterable[tuple]) -> Iterator[tuple]:
+        """Verifica se as tags MySword de cada versículo formam pares e exibe as que não formam
+
+        Args:
+            rows (Iterable[tuple]): Registros (Book, Chapter, Verse, Scripture)
+
+        Yields:
+            tuple: Os mesmos registros
+        """
+        for row in rows:
+            problems = text_utils.find_malformed_tags(row[3])
+
+            if problems:
+                self.malformed_rows += 1
+
+                for problem in problems[:MAX_TAG_PROBLEMS]:
+                    print(f"{row[0]}.{row[1]}.{row[2]}: a tag {problem.tag} {problem.problem} (posição {problem.position})")
+
+                if len(problems) > MAX_TAG_PROBLEMS:
+                    print(f"{row[0]}.{row[1]}.{row[2]}: e mais {len(problems) - MAX_TAG_PROBLEMS} tag(s) sem par")
+
+            yield row
+
+    def minify_texts(self, table: str, texts: list[str]) -> list[str]:
+        """Reduz o HTML dos textos e soma no relatório os bytes economizados
+
+        Args:
+            table (str): A tabela onde os textos serão gravados
+            texts (list[str]): Os textos já convertidos
+
+        Returns:
+            list[str]: Os textos reduzidos
+        """
+        if not texts:
+            return texts
+
+        minified = [text_utils.minify_markup(text) for text in texts]
+        self.size_report.add(table, texts, minified)
+
+        return minified
+
+    def count_rows(self, rows: Iterable[tuple], phase: PhaseMetrics) -> Iterator[tuple]:
+        """Contabiliza na etapa os registros lidos e os bytes dos seus textos
+
+        Args:
+            rows (Iterable[tuple]): Registros (Book, Chapter, Verse, Scripture)
+            phase (PhaseMetrics): A etapa onde os valores são somados
+
+        Yields:
+            tuple: Os mesmos registros
+        """
+        for row in rows:
+            phase.rows += 1
+            phase.bytes_in += self.metrics.text_bytes((row[3],))
+            yield row
+
+    def finish_output_database(self, database: OutputDatabase, writer: BulkWriter) -> None:
+        """Confirma a gravação, cria os índices e grava o banco de saída no caminho
+        final, compactando-o se pedido
+
+        Args:
+            database (OutputDatabase): O banco de saída
+            writer (BulkWriter): Responsável pela gravação do banco de saída
+        """
+        with self.metrics.phase("commit"):
+            writer.commit()
+
+        with self.metrics.phase("vacuum" if self.options.vacuum else "publish"):
+            database.publish(self.options.vacuum)
+
+    def save_pure_bible(self, records: BibleBatch) -> None:
+        """Salva um lote de versículos na bíblia de saída
+
+        Args:
+            records (BibleBatch): Os versículos já convertidos
+        """
+
+        with self.metrics.phase("save_pure_bible", len(records),
+                                bytes_out=self.metrics.text_bytes(records.texts)):
+            self.output_bible_writer.insert("INSERT INTO Bible (Book, Chapter, Verse, Scripture) VALUES (?, ?, ?, ?)", records)
+
+    def save_commentaries(self, records: BibleBatch) -> None:
+        """Salva um lote de comentários
+
+        Args:
+            records (BibleBatch): Os comentários já convertidos
+        """
+
+        texts = records.texts
+
+        with self.metrics.phase("save_commentaries", len(records), bytes_out=self.metrics.text_bytes(texts)):
+            if self.data_store is not None:
+                texts = [self.data_store.replace_images(text) for text in texts]
+                self.data_store.flush()
+
+            self.output_commentary_writer.insert("""INSERT INTO VerseCommentary (Book, ChapterBegin, VerseBegin, ChapterEnd, VerseEnd, Comments) VALUES (?, ?, ?, ?, ?, ?)""",
+                                                 zip(records.books, records.chapters, records.verses,
+                                                     records.chapters, records.verses, texts))
+
+    def save_aggregated_commentaries(self) -> None:
+        """Salva os comentários já agrupados pelo CommentaryAggregator"""
+
+        book_rows, chapter_rows, verse_rows = self.commentary_aggregator.drain()
+        rows = len(book_rows) + len(chapter_rows) + len(verse_rows)
+
+        if not rows:
+            return
+
+        self.aggregated_rows += rows
+        self.submit("commentary", self.write_aggregated_commentaries, book_rows, chapter_rows, verse_rows)
+
+    def write_aggregated_commentaries(self, book_rows: list[tuple], chapter_rows: list[tuple],
+                                      verse_rows: list[tuple]) -> None:
+        """Grava os registros devolvidos por CommentaryAggregator.drain
+
+        Args:
+            book_rows (list[tuple]): Registros de BookCommentary
+            chapter_rows (list[tuple]): Registros de ChapterCommentary
+            verse_rows (list[tuple]): Registros de VerseCommentary
+        """
+
+        rows = len(book_rows) + len(chapter_rows) + len(verse_rows)
+
+        if self.data_store is not None:
+            book_rows, chapter_rows, verse_rows = (
+                [row[:-1] + (self.data_store.replace_images(row[-1]),) for row in table_rows]
+                for table_rows in (book_rows, chapter_rows, verse_rows))
+            self.data_store.flush()
+
+        with self.metrics.phase("save_commentaries", rows):
+            self.output_commentary_writer.insert("INSERT INTO BookCommentary (Book, Comments) VALUES (?, ?)",
+                                                 book_rows)
+            self.output_commentary_writer.insert("INSERT INTO ChapterCommentary (Book, Chapter, Comments) VALUES (?, ?, ?)",
+                                                 chapter_rows)
+            self.output_commentary_writer.insert("""INSERT INTO VerseCommentary (Book, ChapterBegin, VerseBegin, ChapterEnd, VerseEnd, Comments) VALUES (?, ?, ?, ?, ?, ?)""",
+                                                 verse_rows)
+
+    def remove_previous_output(self) -> None:
+        """Remove os módulos e o manifesto gerados por uma conversão anterior.
+        Quando os módulos são montados fora do diretório de saída, os anteriores só
+        são substituídos ao final de uma conversão bem-sucedida
+        """
+        paths = [self.manifest_path]
+
+        if self.options.build == "direct":
+            paths.append(self.output_bible_database_path)
+
+            if not self.options.keep_commentary:
+                paths.append(self.output_commentary_database_path)
+
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def commentary_database_empty(self) -> bool:
+        """Checa se as tabelas de comentários do banco de saída ficaram vazias (ex.: os
+        comentários foram removidos da bíblia de origem desde a conversão anterior)
+
+        Returns:
+            bool: Verdadeiro ou falso
+        """
+        connection = self.output_commentary_database.connection
+        tables = [name for name, in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%Commentary'")]
+
+        return all(connection.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() is None for table in tables)
+
+    def discard_output_databases(self) -> None:
+        """Descarta os bancos de saída que estavam sendo montados quando a conversão
+        falhou. Os módulos no diretório de saída não são alterados"""
+
+        for database in (self.output_bible_database, self.output_commentary_database):
+            if database is not None:
+                database.discard()
+
+    def output_settings(self) -> dict[str, object]:
+        """Retorna as opções que alteram o conteúdo dos módulos gerados, gravadas no
+        manifesto. Módulos gerados com outras opções não podem ser atualizados
+        capítulo a capítulo
+
+        Returns:
+            dict[str, object]: As opções, pelo nome
+        """
+
+        return {
+            "aggregate": self.options.aggregate,
+            "store_images": self.options.store_images,
+            "minify": self.options.minify,
+            "page_size": self.options.page_size,
+        }
+
+    def convert(self) -> ConversionResult:
+        """Gerencia a conversão da bíblia
+
+        Returns:
+            ConversionResult: Os módulos gravados e o resumo da conversão
+        """
+        start = time.perf_counter()
+        result = ConversionResult(self.input_database_path, [], 0.0)
+
+        if self.options.incremental:
+            from Manifest import Manifest
+
+            self.current_manifest = Manifest(self.manifest_path, self.output_settings())
+
+            if os.path.exists(self.output_bible_database_path):
+                self.previous_manifest = Manifest.load(self.manifest_path)
+
+            if self.previous_manifest is not None and not self.current_manifest.compatible(self.previous_manifest):
+                print("As opções ou a versão do conversor mudaram desde a conversão anterior - os módulos serão gerados novamente.")
+                self.previous_manifest = None
+
+        if self.previous_manifest is None:
+            self.remove_previous_output()
+
+        if self.options.aggregate:
+            from CommentaryAggregator import CommentaryAggregator
+
+            # Com os capítulos atualizados um a um, um comentário do livro ficaria desatualizado
+            self.commentary_aggregator = CommentaryAggregator(promote_books=not self.options.incremental)
+
+        try:
+            with closing(connect_to_source(self.input_database_path)) as self.input_database:
+                with self.metrics.phase("configure_output_bible_database"):
+                    self.configure_output_bible_database()
+
+                if self.previous_manifest is not None and not self.options.keep_commentary and \
+                        os.path.exists(self.output_commentary_database_path):
+                    with self.metrics.phase("configure_commentary_database"):
+                        self.configure_commentary_database()
+
+                print("Extraindo versículos...")
+
+                # Ordena somente as chaves quando a tabela não tiver um índice
+                with self.metrics.phase("scan_order"):
+                    self.scan = BibleScan(self.input_database)
+
+                if self.options.attach:
+                    self.process_attached_database()
+                elif self.options.pipeline:
+                    # A consulta é percorrida pela thread de leitura, numa conexão própria
+                    with closing(connect_to_source(self.input_database_path, check_same_thread=False)) as reader:
+                        self.scan.prepare(reader)
+                        self.process_database(reader.execute(self.scan.query(where=self.book_condition())))
+                else:
+                    self.scan.prepare(self.input_database)
+
+                    cursor: sqlite3.Cursor = self.input_database.cursor()
+                    cursor.execute(self.scan.query(where=self.book_condition()))
+
+                    self.process_database(cursor)
+                    cursor.close()
+
+                if self.previous_manifest is not None:
+                    changed = [key for key, digest in self.current_manifest.chapters.items()
+                               if self.previous_manifest.chapters.get(key) != digest]
+                    removed = [key for key in self.previous_manifest.chapters
+                               if key not in self.current_manifest.chapters]
+
+                    self.delete_chapters(tuple(map(int, key.split("."))) for key in removed)
+                    print(f"{len(changed)} capítulo(s) alterado(s) e {len(removed)} removido(s) desde a conversão anterior.")
+
+                    result.changed_chapters = len(changed)
+                    result.removed_chapters = len(removed)
+
+                if self.commentary_aggregator is not None and self.commentary_aggregator.source_rows:
+                    print(f"{self.commentary_aggregator.source_rows} comentário(s) agrupado(s) em {self.aggregated_rows} registro(s).")
+
+                if self.data_store is not None:
+                    self.data_store.print_statistics()
+
+                if self.options.check_tags:
+                    print(f"{self.malformed_rows} versículo(s) com tags sem par.")
+                    result.malformed_rows = self.malformed_rows
+
+                print_cache_statistics()
+                print("Feito!\n")
+
+                if self.previous_manifest is not None and self.output_commentary_writer is not None and \
+                        self.commentary_database_empty():
+                    # A atualização removeu todos os comentários: o .cmti é removido, como numa conversão completa
+                    self.output_commentary_database.discard()
+                    self.output_commentary_database = None
+                    self.output_commentary_writer = None
+
+                    if os.path.exists(self.output_commentary_database_path):
+                        os.remove(self.output_commentary_database_path)
+                self.finish_output_database(self.output_bible_database, self.output_bible_writer)
+                result.outputs.append(self.output_bible_database_path)
+
+                if self.output_commentary_writer is not None:
+                    self.finish_output_database(self.output_commentary_database, self.output_commentary_writer)
+                    result.outputs.append(self.output_commentary_database_path)
+                    result.study_bible = True
+                else:
+                    """Os comentários só são gravados se for uma bíblia de estudos"""
+                    print("Não é uma bíblia de estudos - somente o texto tratado foi extraído.")
+
+                    if self.previous_manifest is None and not self.options.keep_commentary and \
+                            os.path.exists(self.output_commentary_database_path):
+                        os.remove(self.output_commentary_database_path)
+        except BaseException:
+            self.discard_output_databases()
+            raise
+
+        if self.current_manifest is not None:
+            self.current_manifest.save()
+
+        if self.size_report is not None:
+            self.size_report.print(result.outputs)
+
+        result.seconds = time.perf_counter() - start
+
+        return result
+
+
+def convert(input_path: str, directory: str, options: Optional[ConversionOptions] = None,
+            metrics: Optional[Metrics] = None) -> ConversionResult:
+    """Converte a bíblia informada, gravando os módulos no diretório indicado
+
+    Args:
+        input_path (str): Caminho da bíblia MySword
+        directory (str): Diretório (já existente) onde os módulos serão gravados
+        options (Optional[ConversionOptions]): Opções da conversão
+        metrics (Optional[Metrics]): Medições de cada etapa (desligadas por padrão)
+
+    Returns:
+        ConversionResult: Os módulos gravados e o resumo da conversão
+    """
+    options = options or ConversionOptions()
+    configure_transform_cache(options.cache_size, options.cache_file)
+
+    return BibleConverter(input_path, directory, options, metrics).convert()
+
+
+def main() -> None:
+    """Converte a bíblia informada na linha de comando"""
+    import argparse
+    from Database import OUTPUT_TARGETS, PAGE_SIZES
+
+    defaults = ConversionOptions()
+
+    parser = argparse.ArgumentParser(
+        description="Converte uma bíblia MySword para o padrão e-Sword HD")
+    parser.add_argument("input", help="Caminho da bíblia MySword")
+    parser.add_argument("-j", "--jobs", type=int, default=defaults.jobs,
+                        help="Quantidade de processos usados na conversão dos versículos")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Compacta os módulos gerados com VACUUM ao final da conversão")
+    parser.add_argument("--cache-size", type=int, default=defaults.cache_size,
+                        help="Quantidade de comentários convertidos mantidos em cache (0 desliga o cache)")
+    parser.add_argument("--cache-file",
+                        help="Banco SQLite onde as conversões são guardadas para as próximas execuções")
+    parser.add_argument("--metrics",
+                        help="Grava um relatório JSON com tempo, registros, bytes e memória de cada etapa (\"-\" para a saída padrão)")
+    parser.add_argument("--profile",
+                        help="Grava as estatísticas do cProfile da conversão no arquivo informado")
+    parser.add_argument("-o", "--output",
+                        help="Diretório de saída (por padrão é criado um novo diretório ./outputN)")
+    parser.add_argument("--build", choices=OUTPUT_TARGETS, default=defaults.build,
+                        help="Onde os módulos são montados antes de serem gravados no diretório de saída: arquivo temporário local (temp), memória (memory) ou o próprio diretório de saída (direct)")
+    parser.add_argument("--temp-dir",
+                        help="Diretório dos arquivos temporários de montagem (por padrão o diretório temporário do sistema)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Converte novamente somente os capítulos alterados desde a conversão anterior no mesmo diretório de saída")
+    parser.add_argument("--minify", action="store_true",
+                        help="Reduz o HTML dos versículos e comentários gravados e exibe os bytes economizados em cada tabela")
+    parser.add_argument("--page-size", type=int, choices=PAGE_SIZES,
+                        help="Tamanho de página dos módulos gerados (páginas maiores favorecem módulos grandes)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Lê a bíblia e grava cada módulo de saída em threads separadas, enquanto os versículos são convertidos")
+    parser.add_argument("--attach", action="store_true",
+                        help="Converte dentro do SQLite: anexa a bíblia aos módulos de saída e grava cada tabela com um único INSERT ... SELECT")
+    parser.add_argument("--check-tags", action="store_true",
+                        help="Exibe os versículos com tags MySword sem fechamento ou sem abertura (ex.: <RF> sem <Rf>)")
+    parser.add_argument("--store-images", action="store_true",
+                        help="Grava uma única vez na tabela data as imagens embutidas (base64) nos comentários")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="Agrupa os comentários iguais de versículos consecutivos e promove a comentário do capítulo (ou do livro) os que se aplicam a todos os versículos")
+    arguments = parser.parse_args()
+
+    if arguments.incremental and not arguments.output:
+        print("O modo incremental precisa do diretório de saída da conversão anterior (--output)")
+        sys.exit(-1)
+
+    if not os.path.exists(arguments.input):
+        print(f"O arquivo '{arguments.input}' não foi encontrado")
+        sys.exit(-1)
+
+    if not Utils.get_module_name(arguments.input):
+        print("O nome do arquivo não possui a extensão .bbl.mybible")
+        sys.exit(-1)
+
+    options = ConversionOptions(jobs=max(1, arguments.jobs),
+                                vacuum=arguments.vacuum,
+                                incremental=arguments.incremental,
+                                build=arguments.build,
+                                temp_directory=arguments.temp_dir,
+                                cache_size=arguments.cache_size,
+                                cache_file=arguments.cache_file,
+                                aggregate=arguments.aggregate,
+                                store_images=arguments.store_images,
+                                minify=arguments.minify,
+                                page_size=arguments.page_size,
+                                check_tags=arguments.check_tags,
+                                attach=arguments.attach,
+                                pipeline=arguments.pipeline)
+
+    conflicts = attach_conflicts(options)
+
+    if conflicts:
+        print(f"A opção --attach não pode ser usada com: {', '.join('--' + name.replace('_', '-') for name in conflicts)}")
+        sys.exit(-1)
+
+    if arguments.output:
+        output_directory = arguments.output
+        os.makedirs(output_directory, exist_ok=True)
+    else:
+        output_directory = Utils.create_output_directory()
+
+    metrics = Metrics(enabled=bool(arguments.metrics))
+
+    # Nos processos filhos as medições por função não chegam ao processo principal
+    if arguments.metrics and options.jobs == 1:
+        metrics.instrument(text_utils, TEXT_UTILS_FUNCTIONS)
+
+    profiler = None
+
+    if arguments.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    result = convert(arguments.input, output_directory, options, metrics)
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(arguments.profile)
+
+    transform_cache.close()
+
+    if arguments.metrics:
+        metrics.uninstrument()
+        metrics.save(arguments.metrics,
+                     input=arguments.input,
+                     input_bytes=os.path.getsize(arguments.input),
+                     outputs={path: os.path.getsize(path) for path in result.outputs},
+                     jobs=options.jobs,
+                     wall_seconds=result.seconds,
+                     transform_cache=transform_cache.statistics())
+
+    print(f"Os arquivos convertidos estão na pasta {output_directory}")
+
+
+if __name__ == "__main__":
+    main()
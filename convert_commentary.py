@@ -1,99 +1,252 @@
 import os
 import sys
 import sqlite3
+import time
+from typing import TYPE_CHECKING, Optional
 
-from Database import Database
+from Database import BulkWriter, OutputDatabase, SourceDatabase
+from Metrics import SizeReport
 
 import text_utils
 from Utils import Utils
-from models import CommentaryRow
+from constants import BATCH_SIZE
+from models import CommentaryRow, ConversionOptions, ConversionResult, commentary_row_factory
 
-output_directory: str = "./output"
-"""Diretório onde ficarão armazenados os banco de dados resultantes da conversão"""
+if TYPE_CHECKING:
+    from DataStore import DataStore
 
-input_database: Database
-"""O banco de dados de origem dos comentários"""
 
-output_database: Database
-"""O banco de dados de saída dos comentários"""
+def convert_commentary_row(row: CommentaryRow) -> tuple[str, tuple]:
+    """Converte um registro da tabela Commentary e identifica em qual tabela do
+    padrão e-Sword HD ele deve ser gravado, de acordo com o intervalo de versículos:
+    - capítulo 0: comentário do livro (BookCommentary);
+    - versículo inicial 0: comentário do capítulo (ChapterCommentary);
+    - demais: comentário dos versículos (VerseCommentary).
 
-output_database_path: str
-"""Caminho do banco de dados de saída"""
+    Args:
+        row (CommentaryRow): O registro trazido do banco de origem
 
-commentaries: list[CommentaryRow] = []
-"""Array com todos os registros dos comentários"""
+    Returns:
+        tuple[str, tuple]: O nome da tabela de destino e os valores a serem gravados
+    """
 
+    text = text_utils.convert_commentary_text(row.data or "")
 
-def connect_to_databases() -> None:
-    """Conecta aos bancos de dados de entrada e saída"""
+    if not row.chapter:
+        return "BookCommentary", (row.book, text)
 
-    global input_database, input_database_path
-    global output_database, output_database_path
+    if not row.fromverse:
+        return "ChapterCommentary", (row.book, row.chapter, text)
 
-    input_database = Database(input_database_path)
-    input_database.connect()
+    to_verse = max(row.toverse or 0, row.fromverse)
 
-    output_database = Database(output_database_path)
-    output_database.connect()
+    return "VerseCommentary", (row.book, row.chapter, row.fromverse, row.chapter, to_verse, text)
 
 
-def configure_output_database() -> None:
-    """Configura o banco de dados de saída dos comentários"""
+class CommentaryConverter:
+    """Conversão de um comentário MySword. Guarda todo o estado da conversão,
+    então várias conversões podem ser feitas no mesmo processo
+    """
 
-    global input_database, output_database
+    def __init__(self, input_path: str, directory: str, options: Optional[ConversionOptions] = None) -> None:
+        """
+        Args:
+            input_path (str): Caminho do comentário MySword
+            directory (str): Diretório (já existente) onde o módulo será gravado
+            options (Optional[ConversionOptions]): Opções da conversão (somente
+            `vacuum`, `build`, `temp_directory`, `store_images`, `minify` e
+            `page_size` se aplicam aos comentários)
+        """
+        self.options = options or ConversionOptions()
 
-    output_database.create_commentary_tables()
-    output_database.configure_commentary_details(input_database)
+        self.input_database_path = input_path
+        self.output_directory = directory
+        self.output_database_path = os.path.join(
+            directory, f"{self.options.output_name or Utils.get_module_name(input_path)}.cmti")
 
+        self.input_database: Optional[SourceDatabase] = None
+        self.output_database: Optional[OutputDatabase] = None
+        self.output_writer: Optional[BulkWriter] = None
+        self.data_store: Optional['DataStore'] = None
+        self.size_report: Optional[SizeReport] = SizeReport() if self.options.minify else None
 
-def convert_commentary(commentary: str) -> str:
-  """Faz a conversão do formato do comentário para o padrão da e-Sword HD
+    def remove_previous_output(self) -> None:
+        """Remove o módulo gerado por uma conversão anterior quando o novo é gravado
+        diretamente no diretório de saída. Nos demais modos o anterior só é
+        substituído ao final de uma conversão bem-sucedida
+        """
+        if self.options.build == "direct" and os.path.exists(self.output_database_path):
+            os.remove(self.output_database_path)
 
-  Args:
-      commentary (str): Conteúdo do comentário
+    def connect_to_databases(self) -> None:
+        """Conecta aos bancos de dados de entrada e saída"""
 
-  Returns:
-      str: Retorna o comentário convertido
-  """
+        self.input_database = SourceDatabase(self.input_database_path)
+        self.input_database.connect()
 
-  text: str = ""
-  
-  return text
+        self.output_database = OutputDatabase(self.output_database_path, self.options.build,
+                                              self.options.temp_directory, self.options.page_size)
+        self.output_database.connect()
+        self.output_writer = BulkWriter(self.output_database.connection)
 
+    def configure_output_database(self) -> None:
+        """Configura o banco de dados de saída dos comentários"""
 
-def convert_commentary() -> None:
-    """Gerencia a conversão do comentário"""
+        self.output_database.create_commentary_tables(self.output_writer)
+        self.output_database.configure_commentary_details(self.input_database)
 
-    global input_database, output_database
+        if self.options.store_images:
+            from DataStore import DataStore
 
-    connect_to_databases()
-    configure_output_database()
+            self.data_store = DataStore(self.output_writer)
 
-    cursor: sqlite3.Cursor = input_database.execute(
-        "SELECT * FROM Commentary ORDER BY id ASC LIMIT 10")
+    def save_commentaries(self, rows: list[CommentaryRow]) -> None:
+        """Converte e grava um lote de comentários
 
-    row: CommentaryRow = CommentaryRow(*cursor.fetchone())
+        Args:
+            rows (list[CommentaryRow]): Os registros trazidos do banco de origem
+        """
 
+        tables: dict[str, list[tuple]] = {
+            "BookCommentary": [],
+            "ChapterCommentary": [],
+            "VerseCommentary": [],
+        }
 
-if len(sys.argv) < 2:
-    print(
-        f"Use:\n\tpython {os.path.basename(__file__)} <Caminho do comentário MyBible>")
-    sys.exit(-1)
+        for row in rows:
+            table, values = convert_commentary_row(row)
 
-input_database_path = sys.argv[1]
-if not os.path.exists(input_database_path):
-    print(f"O arquivo '{input_database_path}' não foi encontrado")
-    sys.exit(-1)
+            if self.size_report is not None:
+                text = text_utils.minify_markup(values[-1])
+                self.size_report.add(table, (values[-1],), (text,))
+                values = values[:-1] + (text,)
 
-output_directory = Utils.create_output_directory()
+            if self.data_store is not None:
+                values = values[:-1] + (self.data_store.replace_images(values[-1]),)
 
-filename = os.path.splitext(input_database_path)[0].split('.')[0]
-if not filename:
-    print("O nome do arquivo não possui a extensão .bbl.mybible")
-    sys.exit(-1)
+            tables[table].append(values)
 
-output_database_path = os.path.join(
-    output_directory, f"{filename}.cmti")
+        if self.data_store is not None:
+            self.data_store.flush()
 
-convert_commentary()
-# print(f"Os arquivos convertidos estão na pasta {output_directory}")
+        self.output_writer.insert("INSERT INTO BookCommentary (Book, Comments) VALUES (?, ?)",
+                                  tables["BookCommentary"])
+        self.output_writer.insert("INSERT INTO ChapterCommentary (Book, Chapter, Comments) VALUES (?, ?, ?)",
+                                  tables["ChapterCommentary"])
+        self.output_writer.insert("""INSERT INTO VerseCommentary (Book, ChapterBegin, VerseBegin, ChapterEnd, VerseEnd, Comments) VALUES (?, ?, ?, ?, ?, ?)""",
+                                  tables["VerseCommentary"])
+
+    def convert(self) -> ConversionResult:
+        """Gerencia a conversão do comentário
+
+        Returns:
+            ConversionResult: O módulo gravado e o tempo gasto
+        """
+        start = time.perf_counter()
+
+        self.remove_previous_output()
+        self.connect_to_databases()
+
+        try:
+            self.configure_output_database()
+
+            cursor: sqlite3.Cursor = self.input_database.connection.cursor()
+            cursor.row_factory = commentary_row_factory
+            cursor.execute(
+                "SELECT id, book, chapter, fromverse, toverse, data FROM Commentary ORDER BY id ASC")
+
+            print("Convertendo comentários...")
+
+            rows = cursor.fetchmany(BATCH_SIZE)
+
+            while rows:
+                self.save_commentaries(rows)
+                rows = cursor.fetchmany(BATCH_SIZE)
+
+            cursor.close()
+
+            if self.data_store is not None:
+                self.data_store.print_statistics()
+
+            self.output_writer.commit()
+            self.output_database.publish(self.options.vacuum)
+        except BaseException:
+            self.output_database.discard()
+            raise
+        finally:
+            self.input_database.connection.close()
+
+        print("Feito!\n")
+
+        if self.size_report is not None:
+            self.size_report.print([self.output_database_path])
+
+        return ConversionResult(self.input_database_path, [self.output_database_path],
+                                time.perf_counter() - start)
+
+
+def convert(input_path: str, directory: str, options: Optional[ConversionOptions] = None) -> ConversionResult:
+    """Converte o comentário informado, gravando o módulo no diretório indicado
+
+    Args:
+        input_path (str): Caminho do comentário MySword
+        directory (str): Diretório (já existente) onde o módulo será gravado
+        options (Optional[ConversionOptions]): Opções da conversão
+
+    Returns:
+        ConversionResult: O módulo gravado e o tempo gasto
+    """
+    return CommentaryConverter(input_path, directory, options).convert()
+
+
+def main() -> None:
+    """Converte o comentário informado na linha de comando"""
+    import argparse
+    from Database import OUTPUT_TARGETS, PAGE_SIZES
+
+    parser = argparse.ArgumentParser(
+        description="Converte um comentário MySword para o padrão e-Sword HD")
+    parser.add_argument("input", help="Caminho do comentário MySword")
+    parser.add_argument("-o", "--output",
+                        help="Diretório de saída (por padrão é criado um novo diretório ./outputN)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Compacta o módulo gerado com VACUUM ao final da conversão")
+    parser.add_argument("--minify", action="store_true",
+                        help="Reduz o HTML dos comentários gravados e exibe os bytes economizados em cada tabela")
+    parser.add_argument("--page-size", type=int, choices=PAGE_SIZES,
+                        help="Tamanho de página do módulo gerado (páginas maiores favorecem módulos grandes)")
+    parser.add_argument("--store-images", action="store_true",
+                        help="Grava uma única vez na tabela data as imagens embutidas (base64) nos comentários")
+    parser.add_argument("--build", choices=OUTPUT_TARGETS, default=ConversionOptions.build,
+                        help="Onde o módulo é montado antes de ser gravado no diretório de saída: arquivo temporário local (temp), memória (memory) ou o próprio diretório de saída (direct)")
+    parser.add_argument("--temp-dir",
+                        help="Diretório dos arquivos temporários de montagem (por padrão o diretório temporário do sistema)")
+    arguments = parser.parse_args()
+
+    if not os.path.exists(arguments.input):
+        print(f"O arquivo '{arguments.input}' não foi encontrado")
+        sys.exit(-1)
+
+    if not Utils.get_module_name(arguments.input):
+        print("O nome do arquivo não possui a extensão .cmt.mybible")
+        sys.exit(-1)
+
+    options = ConversionOptions(vacuum=arguments.vacuum,
+                                store_images=arguments.store_images,
+                                minify=arguments.minify,
+                                page_size=arguments.page_size,
+                                build=arguments.build,
+                                temp_directory=arguments.temp_dir)
+
+    if arguments.output:
+        output_directory = arguments.output
+        os.makedirs(output_directory, exist_ok=True)
+    else:
+        output_directory = Utils.create_output_directory()
+
+    convert(arguments.input, output_directory, options)
+    print(f"O arquivo convertido está na pasta {output_directory}")
+
+
+if __name__ == "__main__":
+    main()
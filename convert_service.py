@@ -0,0 +1,441 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import signal
+import argparse
+import itertools
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, redirect_stdout, suppress
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+import convert_bible
+import convert_commentary
+import convert_batch
+from Database import OUTPUT_TARGETS
+from Utils import Utils
+from models import ConversionOptions
+
+
+JOB_OPTIONS: tuple[str, ...] = ("vacuum", "incremental", "aggregate", "store_images", "minify", "page_size", "attach", "pipeline", "build", "temp_dir")
+"""Opções aceitas em cada pedido de conversão"""
+
+JOB_HISTORY: int = 1000
+"""Quantidade de jobs encerrados mantidos para consulta (status/watch)"""
+
+progress_queue: Any = None
+"""Fila (compartilhada entre os processos) por onde os processos filhos enviam o progresso dos jobs"""
+
+current_job: Optional[int] = None
+"""Job em execução no processo filho"""
+
+
+class ProgressWriter(io.TextIOBase):
+    """Saída padrão dos processos filhos: cada linha impressa pela conversão é
+    enviada como progresso do job em execução"""
+
+    def write(self, text: str) -> int:
+        for line in text.splitlines():
+            line = line.strip()
+
+            if line and not line.startswith("#"):
+                progress_queue.put((current_job, line))
+
+        return len(text)
+
+
+def warm_worker(queue: Any) -> None:
+    """Inicializa um processo filho. Os módulos da conversão (e as expressões
+    regulares do text_utils) já foram carregados na importação deste módulo,
+    então os jobs seguintes não pagam mais esse custo
+
+    Args:
+        queue (Any): Fila de progresso compartilhada
+    """
+    global progress_queue
+
+    progress_queue = queue
+
+
+def ping() -> int:
+    """Tarefa vazia, usada para iniciar os processos filhos antes do primeiro job"""
+    return os.getpid()
+
+
+def run_job(job_id: int, path: str, directory: str, options: dict[str, Any]) -> tuple[float, Optional[str]]:
+    """Converte um módulo num processo filho, enviando o progresso pela fila
+
+    Args:
+        job_id (int): Identificador do job
+        path (str): Caminho do módulo MySword
+        directory (str): Diretório de saída
+        options (dict[str, Any]): Opções do job (ver JOB_OPTIONS)
+
+    Returns:
+        tuple[float, Optional[str]]: O tempo gasto e o erro, caso a conversão tenha falhado
+    """
+    global current_job
+
+    current_job = job_id
+    start = time.perf_counter()
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+
+        conversion_options = ConversionOptions(vacuum=bool(options.get("vacuum", False)),
+                                               incremental=bool(options.get("incremental", False)),
+                                               aggregate=bool(options.get("aggregate", False)),
+                                               store_images=bool(options.get("store_images", False)),
+                                               minify=bool(options.get("minify", False)),
+                                               page_size=options.get("page_size"),
+                                               attach=bool(options.get("attach", False)),
+                                               pipeline=bool(options.get("pipeline", False)),
+                                               build=options.get("build", ConversionOptions.build),
+                                               temp_directory=options.get("temp_dir"))
+
+        with redirect_stdout(ProgressWriter()):
+            if path.endswith(convert_batch.BIBLE_EXTENSION):
+                convert_bible.convert(path, directory, conversion_options)
+            else:
+                convert_commentary.convert(path, directory, conversion_options)
+    except Exception as error:
+        return time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    finally:
+        # Marca o fim do progresso do job
+        progress_queue.put((job_id, None))
+        current_job = None
+
+    return time.perf_counter() - start, None
+
+
+@dataclass
+class Job:
+    """Uma conversão pedida ao serviço"""
+    id: int
+    path: str
+    directory: str
+    options: dict[str, Any]
+    status: str = "queued"
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+    events: list[dict[str, Any]] = field(default_factory=list)
+    listeners: set[asyncio.Queue] = field(default_factory=set)
+    drained: asyncio.Event = field(default_factory=asyncio.Event)
+    """Sinalizado quando todo o progresso enviado pelo processo filho foi repassado"""
+
+    def summary(self) -> dict[str, Any]:
+        """Os dados do job enviados aos clientes"""
+        return {"job": self.id, "input": self.path, "output": self.directory,
+                "status": self.status, "seconds": self.seconds, "error": self.error}
+
+
+class ConversionService:
+    """Serviço de conversão: recebe jobs por um socket (uma mensagem JSON por
+    linha), os enfileira e os executa num conjunto fixo de processos filhos
+    mantidos carregados entre os jobs, enviando o progresso aos clientes
+    """
+
+    def __init__(self, workers: int, queue_size: int = 1000) -> None:
+        """
+        Args:
+            workers (int): Quantidade de conversões executadas ao mesmo tempo
+            queue_size (int): Quantidade máxima de jobs aguardando na fila
+        """
+        self.workers = workers
+        self.queue: asyncio.Queue[Job] = asyncio.Queue(queue_size)
+        self.jobs: dict[int, Job] = {}
+        self.ids = itertools.count(1)
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.Queue()
+        self.executor = self.create_executor()
+        self.tasks: list[asyncio.Task] = []
+        self.output_locks: dict[str, asyncio.Lock] = {}
+        """Uma trava por módulo de saída: jobs do mesmo módulo são executados um de cada vez"""
+        self.output_users: Counter[str] = Counter()
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        """Cria o conjunto de processos filhos"""
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker,
+                                   initargs=(self.progress,))
+
+    def replace_executor(self, broken: ProcessPoolExecutor) -> None:
+        """Substitui o conjunto de processos filhos depois que um deles morreu
+        (BrokenProcessPool), para que os próximos jobs não falhem também
+
+        Args:
+            broken (ProcessPoolExecutor): O conjunto quebrado (se outro despachante
+            já o substituiu, nada é feito)
+        """
+        if self.executor is not broken:
+            return
+
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.create_executor()
+
+    async def start(self) -> None:
+        """Inicia os processos filhos, os despachantes da fila e o repasse do progresso"""
+        loop = asyncio.get_running_loop()
+
+        await asyncio.gather(*(loop.run_in_executor(self.executor, ping)
+                               for _ in range(self.workers)))
+
+        self.tasks = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.relay_progress()))
+
+    async def stop(self) -> None:
+        """Encerra os despachantes e os processos filhos"""
+        self.progress.put((None, None))
+
+        for task in self.tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+    def publish(self, job: Job, event: str, **values: Any) -> None:
+        """Registra um evento do job e o envia aos clientes que o acompanham"""
+        message = {"event": event, "job": job.id, **values}
+        job.events.append(message)
+
+        for listener in job.listeners:
+            listener.put_nowait(message)
+
+    def submit(self, path: str, directory: str, options: dict[str, Any]) -> Job:
+        """Enfileira uma conversão
+
+        Raises:
+            ValueError: Se o pedido for inválido
+            asyncio.QueueFull: Se a fila estiver cheia
+
+        Returns:
+            Job: O job criado
+        """
+        if not convert_batch.is_module(path):
+            raise ValueError(f"'{path}' não é uma bíblia ou comentário MySword")
+
+        unknown = set(options) - set(JOB_OPTIONS)
+
+        if unknown:
+            raise ValueError(f"Opções desconhecidas: {', '.join(sorted(unknown))}")
+
+        if options.get("build", "temp") not in OUTPUT_TARGETS:
+            raise ValueError(f"Destino de montagem desconhecido: {options['build']}")
+
+        job = Job(next(self.ids), path, directory, options)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self.publish(job, "queued", position=self.queue.qsize())
+
+        return job
+
+    @asynccontextmanager
+    async def lock_output(self, job: Job) -> AsyncIterator[None]:
+        """Aguarda o fim dos outros jobs que gravam o mesmo módulo de saída"""
+        key = os.path.join(job.directory, Utils.get_module_name(job.path))
+        lock = self.output_locks.setdefault(key, asyncio.Lock())
+        self.output_users[key] += 1
+
+        try:
+            async with lock:
+                yield
+        finally:
+            self.output_users[key] -= 1
+
+            if not self.output_users[key]:
+                del self.output_users[key]
+                del self.output_locks[key]
+
+    async def dispatch(self) -> None:
+        """Executa os jobs da fila, um de cada vez"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self.queue.get()
+
+            async with self.lock_output(job):
+                job.status = "running"
+                self.publish(job, "started")
+                executor = self.executor
+
+                try:
+                    job.seconds, job.error = await loop.run_in_executor(
+                        executor, run_job, job.id, job.path, job.directory, job.options)
+                    await job.drained.wait()
+                except BrokenProcessPool as error:
+                    job.error = f"{type(error).__name__}: {error}"
+                    self.replace_executor(executor)
+
+            job.status = "failed" if job.error else "finished"
+            self.publish(job, job.status, seconds=job.seconds, error=job.error)
+            self.queue.task_done()
+            self.forget_old_jobs()
+
+    def forget_old_jobs(self) -> None:
+        """Descarta os jobs encerrados mais antigos, mantendo somente os JOB_HISTORY últimos"""
+        done = [job.id for job in self.jobs.values() if job.status in ("finished", "failed")]
+
+        for job_id in done[:max(0, len(done) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    async def relay_progress(self) -> None:
+        """Repassa aos jobs as linhas de progresso enviadas pelos processos filhos"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job_id, line = await loop.run_in_executor(None, self.progress.get)
+
+            if job_id is None:
+                break
+
+            job = self.jobs.get(job_id)
+
+            if job is None:
+                continue
+
+            if line is None:
+                job.drained.set()
+            else:
+                self.publish(job, "progress", message=line)
+
+    async def follow(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        """Envia ao cliente os eventos do job (os anteriores e os novos) até o seu fim"""
+        listener: asyncio.Queue = asyncio.Queue()
+
+        for message in job.events:
+            listener.put_nowait(message)
+
+        job.listeners.add(listener)
+
+        try:
+            while True:
+                message = await listener.get()
+                await send(writer, message)
+
+                if message["event"] in ("finished", "failed"):
+                    break
+        finally:
+            job.listeners.discard(listener)
+
+    async def handle(self, request: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        """Atende um pedido:
+        - {"action": "convert", "input": ..., "output": ..., "options": {...}, "wait": true}
+        - {"action": "watch", "job": id}
+        - {"action": "status"}
+        """
+        if not isinstance(request, dict):
+            raise ValueError("O pedido deve ser um objeto JSON")
+
+        action = request.get("action")
+
+        if action == "convert":
+            job = self.submit(os.path.abspath(request["input"]),
+                              os.path.abspath(request["output"]),
+                              request.get("options") or {})
+
+            if request.get("wait", True):
+                await self.follow(job, writer)
+            else:
+                await send(writer, job.summary())
+        elif action == "watch":
+            job = self.jobs.get(request.get("job"))
+
+            if job is None:
+                raise ValueError(f"Job desconhecido: {request.get('job')}")
+
+            await self.follow(job, writer)
+        elif action == "status":
+            await send(writer, {"queued": self.queue.qsize(), "workers": self.workers,
+                                "jobs": [job.summary() for job in self.jobs.values()]})
+        else:
+            raise ValueError(f"Ação desconhecida: {action}")
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Atende uma conexão: cada linha recebida é um pedido em JSON"""
+        try:
+            while line := await reader.readline():
+                try:
+                    await self.handle(json.loads(line), writer)
+                except asyncio.QueueFull:
+                    await send(writer, {"event": "error", "error": "A fila de conversões está cheia"})
+                except (ValueError, KeyError, TypeError) as error:
+                    await send(writer, {"event": "error", "error": f"{type(error).__name__}: {error}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def send(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    """Envia uma mensagem JSON (uma por linha) ao cliente"""
+    writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def serve(service: ConversionService, socket_path: Optional[str], host: str, port: int) -> None:
+    """Inicia o serviço e atende os clientes até ser interrompido
+
+    Args:
+        service (ConversionService): O serviço de conversão
+        socket_path (Optional[str]): Socket Unix onde o serviço escuta (se informado)
+        host (str): Endereço TCP onde o serviço escuta (quando não há socket Unix)
+        port (int): Porta TCP
+    """
+    await service.start()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        server = await asyncio.start_unix_server(service.serve_client, socket_path)
+        print(f"Serviço de conversão ouvindo em {socket_path} ({service.workers} processos)")
+    else:
+        server = await asyncio.start_server(service.serve_client, host, port)
+        print(f"Serviço de conversão ouvindo em {host}:{port} ({service.workers} processos)")
+
+    stopping = asyncio.Event()
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        # Indisponível no Windows, onde o Ctrl+C chega como KeyboardInterrupt
+        with suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopping.set)
+
+    try:
+        async with server:
+            await stopping.wait()
+    finally:
+        await service.stop()
+
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main() -> None:
+    """Inicia o serviço de conversão com as opções da linha de comando"""
+    parser = argparse.ArgumentParser(
+        description="Serviço local que converte módulos MySword para o padrão e-Sword HD sob demanda")
+    parser.add_argument("--socket", help="Socket Unix onde o serviço escuta")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço TCP onde o serviço escuta (sem --socket)")
+    parser.add_argument("--port", type=int, default=8765, help="Porta TCP onde o serviço escuta (sem --socket)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Quantidade de módulos convertidos ao mesmo tempo")
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="Quantidade máxima de conversões aguardando na fila")
+    arguments = parser.parse_args()
+
+    service = ConversionService(max(1, arguments.workers or 1), max(1, arguments.queue_size))
+
+    try:
+        asyncio.run(serve(service, arguments.socket, arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
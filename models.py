@@ -1,18 +1,10 @@
+from array import array
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
 
 
-@dataclass
-class BibleRow:
-    """Uma classe que representa um registro da tabela Bible"""
-    book: int
-    chapter: int
-    verse: int
-    scripture: str
-
-
-@dataclass
-class CommentaryRow:
+class CommentaryRow(NamedTuple):
     """Uma classe que representa um registro da tabela Commentary"""
     id: int
     book: int
@@ -20,3 +12,145 @@ class CommentaryRow:
     fromverse: int
     toverse: int
     data: str
+
+
+class MalformedTag(NamedTuple):
+    """Uma classe que representa uma tag MySword sem par num texto (ver text_utils.find_malformed_tags)"""
+    position: int
+    """Posição da tag no texto"""
+    tag: str
+    problem: str
+    """Descrição do problema (ex.: "não foi fechada")"""
+
+
+def commentary_row_factory(cursor, row: tuple) -> CommentaryRow:
+    """row_factory do sqlite3 que devolve os registros da tabela Commentary já como CommentaryRow"""
+    return CommentaryRow._make(row)
+
+
+class BibleBatch:
+    """Um lote de registros da tabela Bible guardado em colunas: livro, capítulo e
+    versículo em arrays de inteiros e os textos numa lista. Ocupa bem menos memória
+    (e é serializado bem mais rápido entre processos) que uma lista de objetos"""
+
+    __slots__ = ("books", "chapters", "verses", "texts")
+
+    def __init__(self) -> None:
+        self.books = array("i")
+        self.chapters = array("i")
+        self.verses = array("i")
+        self.texts: list[str] = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "BibleBatch":
+        """Cria o lote a partir de registros (Book, Chapter, Verse, Scripture)
+
+        Args:
+            rows (Iterable[tuple]): Registros trazidos do banco de origem
+
+        Returns:
+            BibleBatch: O lote com os mesmos registros
+        """
+        batch = cls()
+
+        for book, chapter, verse, text in rows:
+            batch.append(book, chapter, verse, text)
+
+        return batch
+
+    def append(self, book: int, chapter: int, verse: int, text: str) -> None:
+        """Acrescenta um registro ao final do lote"""
+        self.books.append(book)
+        self.chapters.append(chapter)
+        self.verses.append(verse)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, str]]:
+        return zip(self.books, self.chapters, self.verses, self.texts)
+
+    def chapter_keys(self) -> Iterator[tuple[int, int]]:
+        """Devolve os pares (livro, capítulo) de cada registro do lote"""
+        return zip(self.books, self.chapters)
+
+
+@dataclass
+class ModuleSurvey:
+    """Uma classe que representa o levantamento de um módulo, feito antes da conversão em lote"""
+    path: str
+    costs: dict[Optional[int], int]
+    """Custo estimado da conversão de cada livro (None quando a tabela não pôde ser lida)"""
+    study_bible: bool = False
+    """Se a bíblia tem comentários (<RF>) e, portanto, também gera um .cmti"""
+
+
+@dataclass
+class BatchJob:
+    """Uma classe que representa a conversão de um módulo (ou de um intervalo de
+    livros de uma bíblia) na conversão em lote"""
+    path: str
+    cost: int
+    """Custo estimado da conversão (bytes dos textos mais um custo fixo por registro)"""
+    books: Optional[tuple[int, int]] = None
+    """Primeiro e último livro convertidos, quando a bíblia foi dividida entre os processos"""
+
+
+@dataclass
+class BatchResult:
+    """Uma classe que representa o resultado da conversão de um módulo em lote"""
+    path: str
+    seconds: float
+    error: Optional[str] = None
+
+
+@dataclass
+class ConversionOptions:
+    """Uma classe que representa as opções de uma conversão"""
+    jobs: int = 1
+    """Quantidade de processos usados na conversão dos versículos"""
+    vacuum: bool = False
+    """Se os módulos de saída devem ser compactados com VACUUM ao final"""
+    incremental: bool = False
+    """Se somente os capítulos alterados desde a conversão anterior devem ser convertidos novamente"""
+    build: str = "temp"
+    """Onde os módulos de saída são montados (ver Database.OUTPUT_TARGETS)"""
+    temp_directory: Optional[str] = None
+    """Diretório dos arquivos temporários de montagem (por padrão o diretório temporário do sistema)"""
+    cache_size: int = 16384
+    """Quantidade de comentários convertidos mantidos em cache (0 desliga o cache)"""
+    cache_file: Optional[str] = None
+    """Banco SQLite onde as conversões são guardadas para as próximas execuções"""
+    aggregate: bool = False
+    """Se os comentários iguais de versículos consecutivos devem ser agrupados (ver CommentaryAggregator)"""
+    store_images: bool = False
+    """Se as imagens embutidas nos comentários devem ser gravadas uma única vez na tabela data (ver DataStore)"""
+    minify: bool = False
+    """Se o HTML dos textos deve ser reduzido antes da gravação (ver text_utils.minify_markup)"""
+    page_size: Optional[int] = None
+    """Tamanho de página dos módulos gerados (ver Database.PAGE_SIZES; por padrão o do SQLite)"""
+    check_tags: bool = False
+    """Se as tags MySword de cada versículo devem ser verificadas (ver text_utils.find_malformed_tags)"""
+    attach: bool = False
+    """Se a bíblia é convertida dentro do SQLite, com INSERT ... SELECT (ver BibleConverter.process_attached_database)"""
+    pipeline: bool = False
+    """Se a leitura e a gravação de cada banco de saída são feitas em threads separadas da conversão (ver Pipeline)"""
+    books: Optional[tuple[int, int]] = None
+    """Primeiro e último livro convertidos (por padrão a bíblia inteira); usado pela divisão das bíblias grandes em convert_batch"""
+    keep_commentary: bool = False
+    """Se o .cmti existente deve ser mantido quando a bíblia não for de estudos; usado por convert_batch quando um comentário tem o mesmo nome da bíblia"""
+    output_name: Optional[str] = None
+    """Nome dos módulos gerados (por padrão o nome do módulo de origem); usado por convert_batch quando dois módulos gravariam o mesmo arquivo"""
+
+
+@dataclass
+class ConversionResult:
+    """Uma classe que representa o resultado da conversão de um módulo"""
+    input: str
+    outputs: list[str]
+    seconds: float
+    study_bible: bool = False
+    changed_chapters: Optional[int] = None
+    removed_chapters: Optional[int] = None
+    malformed_rows: Optional[int] = None
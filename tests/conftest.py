@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from generate_modules import ModuleOptions  # noqa: E402
+
+
+@pytest.fixture
+def module_options() -> ModuleOptions:
+    """Opções de um módulo sintético pequeno"""
+    return ModuleOptions(books=2, chapters=2, verses=5)
@@ -0,0 +1,27 @@
+import sqlite3
+from contextlib import closing
+
+from Database import BibleScan
+
+
+def create_bible(index: str) -> sqlite3.Connection:
+    """Cria uma tabela Bible em memória com o índice informado"""
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE Bible (Book INT, Chapter INT, Verse INT, Scripture TEXT)")
+    connection.execute(f"CREATE INDEX bible_order ON Bible {index}")
+
+    return connection
+
+
+def test_find_index_accepts_ascending_prefix():
+    with closing(create_bible("(Book, Chapter, Verse, Scripture DESC)")) as connection:
+        assert BibleScan.find_index(connection) == "bible_order"
+
+
+def test_find_index_stops_at_descending_column():
+    """Uma coluna decrescente no meio do índice não pode ser pulada"""
+    with closing(create_bible("(Book, Scripture DESC, Chapter, Verse)")) as connection:
+        assert BibleScan.find_index(connection) is None
+
+    with closing(create_bible("(Book, Chapter DESC, Verse)")) as connection:
+        assert BibleScan.find_index(connection) is None
@@ -0,0 +1,24 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import convert_commentary
+from generate_modules import generate_commentary
+from models import ConversionOptions
+
+
+def test_direct_build_replaces_previous_output(tmp_path, module_options):
+    """Uma segunda conversão gravada diretamente no diretório de saída substitui o módulo anterior"""
+    input_path = str(tmp_path / "comentario.cmt.mybible")
+    rows = generate_commentary(input_path, module_options)
+    options = ConversionOptions(build="direct")
+
+    for _ in range(2):
+        result = convert_commentary.convert(input_path, str(tmp_path), options)
+
+    with closing(sqlite3.connect(result.outputs[0])) as connection:
+        total = sum(connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                    for table in ("BookCommentary", "ChapterCommentary", "VerseCommentary"))
+
+    assert os.path.basename(result.outputs[0]) == "comentario.cmti"
+    assert total == rows
@@ -0,0 +1,25 @@
+import os
+from dataclasses import replace
+
+import convert_bible
+from generate_modules import generate_bible
+from models import ConversionOptions
+
+
+def test_update_removes_commentaries_when_bible_loses_them(tmp_path, module_options):
+    """Uma bíblia de estudos que perdeu todos os comentários deixa de gerar o .cmti, como numa conversão completa"""
+    input_path = str(tmp_path / "biblia.bbl.mybible")
+    output_directory = str(tmp_path / "output")
+    os.makedirs(output_directory)
+    options = ConversionOptions(incremental=True)
+
+    generate_bible(input_path, module_options)
+    assert convert_bible.convert(input_path, output_directory, options).study_bible
+
+    os.remove(input_path)
+    generate_bible(input_path, replace(module_options, rf_density=0))
+    result = convert_bible.convert(input_path, output_directory, options)
+
+    assert not result.study_bible
+    assert result.outputs == [os.path.join(output_directory, "biblia.bbli")]
+    assert not os.path.exists(os.path.join(output_directory, "biblia.cmti"))
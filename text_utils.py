@@ -1,5 +1,190 @@
 import re
+from typing import Callable, Iterator, Optional
+
 from constants import ABBREVIATIONS
+from models import MalformedTag
+
+# Expressões regulares pré-compiladas, usadas em todas as conversões.
+# Cada versículo passa por todas elas, então compilá-las uma única vez evita
+# a busca no cache interno do módulo `re` a cada chamada.
+#
+# Os pares de tags da MySword (<TS><Ts>, <FI><Fi>, <RF><Rf>...) não usam
+# expressões com `.*?`: com uma tag sem fechamento, cada tentativa percorreria
+# o resto do texto e um versículo grande levaria tempo quadrático. Eles são
+# localizados por _find_spans, que produz o mesmo resultado em tempo linear.
+_TS_LEVEL_OPENING_PATTERN = re.compile(r'<TS(\d+)>')
+_PARAGRAPH_PATTERN = re.compile(r'<C[MIL]>')
+
+_STRONG_TAG_PATTERN = re.compile(r'<W([HG]\d+)>')
+_STRONG_NUMBER_PATTERN = re.compile(r'\b([HG]\d+)\b')
+
+_CENTRALIZATION_PATTERN = re.compile(r'<p align=.?center.?>')
+
+_EMPTY_H1_PATTERN = re.compile(r'<h1>(\s+)?</h1>')
+_EMPTY_SUP_PATTERN = re.compile(r'<sup>(\s+)?</sup>')
+
+_BIBLE_CLASS_PATTERN = re.compile(r'class=.bible. ')
+_HASH_LINK_PATTERN = re.compile(r'(?<=href=.)#(?=b)')
+
+# Referências nos comentários, em ordem de prioridade: links com o nome do livro
+# no endereço, links numéricos com o nome do livro no texto, links numéricos
+# com o livro abreviado e referências soltas no texto. Nenhuma delas pode
+# começar dentro de outra, então uma única busca com as quatro alternativas
+# encontra exatamente o que quatro substituições em sequência encontrariam
+_NAMED_LINK = r'<a href=.b(?:[A-Z]\w+|[123][A-ZÀ-Ü]\w+) [\d:-]*.>(?P<named>[A-Z]\w+|[123][A-ZÀ-Ü]\w+)(?P<named_verses> [\d:\-]*)</a>'
+_NUMBERED_LINK = r'<a href=.b[\d.-]*.>(?P<numbered>[A-ZÀ-Ü]\w+|[123][A-ZÀ-Ü]\w+)(?P<numbered_verses> [\d:\-]*)</a>'
+_ABBREVIATED_LINK = r'<a href=.b[\d.-]*.>(?P<abbreviated>[A-ZÀ-Ü]\w+\.|[123][A-ZÀ-Ü]\w+\.)(?P<abbreviated_verses> [\d:\-]*)</a>'
+_BARE_REFERENCE = r' (?P<bare>[A-ZÀ-Ü]\w+ [\d:-]+| [123][A-ZÀ-Ü]\w+ [\d:-]+)'
+
+_REFERENCE_PATTERN = re.compile('|'.join((_NAMED_LINK, _NUMBERED_LINK, _ABBREVIATED_LINK, _BARE_REFERENCE)))
+_BARE_REFERENCE_PATTERN = re.compile(_BARE_REFERENCE)
+
+# Abertura do link de uma referência (<a href='b43.3.16'>); o link vai até o </a> seguinte
+_BIBLE_REFERENCE_OPENING_PATTERN = re.compile(
+    r"<a href=.b(\d+)\.(\d+)\.(\d+)(?:-(\d+))?.>")
+
+# Minificação do HTML gerado (ver minify_markup)
+_MARKUP_TOKEN_PATTERN = re.compile(r'<[^<>]*>|[^<]+|<')
+_INLINE_OPENING_PATTERN = re.compile(r'<(i|u|b|sup|font)\b[^<>]*>')
+_ADJACENT_FONT_PATTERN = re.compile(r'(<font [^<>]*>)((?:[^<]|<(?!/?font\b))*)</font>(\s*)\1')
+_ADJACENT_ITALIC_PATTERN = re.compile(r'</i>(\s*)<i>')
+_PARAGRAPH_RUN_PATTERN = re.compile(r'<p>(?:\s*<p>)+')
+_EMPTY_PARAGRAPH_PATTERN = re.compile(r'<p>\s*</p>')
+_SPACE_RUN_PATTERN = re.compile(r'[ \t]{2,}')
+
+BOOK_ABBREVIATIONS: tuple[str, ...] = tuple(
+    ABBREVIATIONS.get(str(number), '') for number in range(max(map(int, ABBREVIATIONS)) + 1))
+"""Abreviações dos livros no padrão e-Sword HD, indexadas pelo número do livro (a posição 0 não é usada)"""
+
+COMMENTARY_SEPARATOR = "<p><hr><p>"
+"""Separador usado entre os comentários (<RF><Rf>) de um mesmo versículo"""
+
+_PARAGRAPH_TAGS = {'<CM>': '<p>', '<CI>': '<br>', '<CL>': '<br>'}
+
+# Tags de abertura e fechamento da MySword verificadas por find_malformed_tags
+_MYSWORD_TAG_PATTERN = re.compile(r'<(?:(TS\d*|RF(?:\s[^<>]*)?|F[IORU])|(Ts|Rf|F[ioru]))>')
+
+
+def _find_spans(text: str, opening: str, closing: str, opening_end: Optional[str] = None,
+                opening_pattern: Optional[re.Pattern] = None,
+                single_line: bool = True) -> Iterator[tuple[int, int, int, Optional[re.Match]]]:
+    """Localiza os trechos `abertura(.*?)fechamento` do texto da esquerda para a
+    direita e sem sobreposição, exatamente como re.finditer, mas em tempo linear:
+    cada busca começa de onde a anterior parou e, quando não há mais fechamento
+    (tag sem fechamento), a busca termina em vez de recomeçar a cada abertura
+
+    Args:
+        text (str): O texto
+        opening (str): Início literal da abertura (ex.: "<FI>")
+        closing (str): Fechamento literal (ex.: "<Fi>")
+        opening_end (Optional[str]): Se informado, a abertura vai até a primeira
+        ocorrência dele (ex.: "<RF" até ">", como em `<RF.*?>`)
+        opening_pattern (Optional[re.Pattern]): Se informado, a abertura é a
+        expressão casada a partir do início literal (ex.: `<TS(\d+)>`)
+        single_line (bool): Se o trecho não pode ter quebras de linha (como o `.` das expressões)
+
+    Yields:
+        tuple[int, int, int, Optional[re.Match]]: Início do trecho, início e fim
+        do conteúdo e a abertura casada por `opening_pattern`
+    """
+    position = 0
+    opening_end_at = closing_at = -1
+
+    while True:
+        start = text.find(opening, position)
+
+        if start < 0:
+            return
+
+        match = None
+        content_start = start + len(opening)
+
+        if opening_pattern is not None:
+            match = opening_pattern.match(text, start)
+
+            if match is None:
+                position = start + 1
+                continue
+
+            content_start = match.end()
+        elif opening_end is not None:
+            # Buscas já feitas valem enquanto estiverem à frente da posição atual
+            if opening_end_at < content_start:
+                opening_end_at = text.find(opening_end, content_start)
+
+                if opening_end_at < 0:
+                    return
+
+            line_break = text.find('\n', content_start, opening_end_at) if single_line else -1
+
+            if line_break >= 0:
+                position = line_break + 1
+                continue
+
+            content_start = opening_end_at + len(opening_end)
+
+        if closing_at < content_start:
+            closing_at = text.find(closing, content_start)
+
+            if closing_at < 0:
+                return
+
+        line_break = text.find('\n', content_start, closing_at) if single_line else -1
+
+        if line_break >= 0:
+            position = line_break + 1
+            continue
+
+        yield start, content_start, closing_at, match
+        position = closing_at + len(closing)
+
+
+def _replace_spans(text: str, replace: Callable[[str, Optional[re.Match]], str],
+                   opening: str, closing: str, **options) -> str:
+    """Substitui os trechos localizados por _find_spans pelo retorno de `replace`,
+    que recebe o conteúdo e a abertura casada (ver _find_spans)"""
+    pieces: list[str] = []
+    position = 0
+
+    for start, content_start, content_end, match in _find_spans(text, opening, closing, **options):
+        pieces.append(text[position:start])
+        pieces.append(replace(text[content_start:content_end], match))
+        position = content_end + len(closing)
+
+    if not pieces:
+        return text
+
+    pieces.append(text[position:])
+
+    return ''.join(pieces)
+
+
+def _wrap(prefix: str, suffix: str) -> Callable[[str, Optional[re.Match]], str]:
+    """Retorna uma substituição que envolve o conteúdo com as tags informadas"""
+    def wrap(content: str, match: Optional[re.Match]) -> str:
+        return prefix + content + suffix
+
+    return wrap
+
+
+_TITLE = _wrap('<h1>', '</h1>')
+_ADDED_WORDS = _wrap('<font color="#gray"><i>', '</i></font>')
+_WORDS_OF_JESUS = _wrap('<font color="#red">', '</font>')
+_UNDERLINE = _wrap('<u>', '</u>')
+_MORPHOLOGY = _wrap('<tvm>', '<tvm>')
+
+
+def _remove(content: str, match: Optional[re.Match]) -> str:
+    return ''
+
+
+def _leveled_title(content: str, match: re.Match) -> str:
+    level = match.group(1)
+    return '<h' + level + '>' + content + '</h' + level
+
+
+def _replace_paragraph_tag(match: re.Match) -> str:
+    return _PARAGRAPH_TAGS[match.group(0)]
 
 
 def convert_tags(text: str) -> str:
@@ -16,21 +201,29 @@ def convert_tags(text: str) -> str:
     Returns:
         str: Texto com as tags convertidas
     """
-    converted_text = re.sub(r'<TS>(.*?)<Ts>', r'<h1>\1</h1>', text)
-    converted_text = re.sub(r'<TS(\d+)>(.*?)<Ts>',
-                            r'<h\1>\2</h\1', converted_text)
-
-    converted_text = converted_text.replace('<CM>', '<p>')
-    converted_text = converted_text.replace('<CI>', '<br>')
-    converted_text = converted_text.replace('<CL>', '<br>')
-
-    converted_text = re.sub(r'<FI>(.*?)<Fi>',
-                            r'<font color="#gray"><i>\1</i></font>', converted_text)
-    converted_text = re.sub(r'<FO>(.*?)<Fo>',
-                            r'<font color="#gray"><i>\1</i></font>', converted_text)
-    converted_text = re.sub(r'<FR>(.*?)<Fr>',
-                            r'<font color="#red">\1</font>', converted_text)
-    converted_text = re.sub(r'<FU>(.*?)<Fu>', r'<u>\1</u>', converted_text)
+    if '<' not in text:
+        return text
+
+    converted_text = text
+
+    if '<TS' in converted_text:
+        converted_text = _replace_spans(converted_text, _TITLE, '<TS>', '<Ts>')
+        converted_text = _replace_spans(converted_text, _leveled_title, '<TS', '<Ts>',
+                                        opening_pattern=_TS_LEVEL_OPENING_PATTERN)
+
+    if '<C' in converted_text:
+        converted_text = _PARAGRAPH_PATTERN.sub(
+            _replace_paragraph_tag, converted_text)
+
+    if '<F' in converted_text:
+        if '<FI>' in converted_text:
+            converted_text = _replace_spans(converted_text, _ADDED_WORDS, '<FI>', '<Fi>')
+        if '<FO>' in converted_text:
+            converted_text = _replace_spans(converted_text, _ADDED_WORDS, '<FO>', '<Fo>')
+        if '<FR>' in converted_text:
+            converted_text = _replace_spans(converted_text, _WORDS_OF_JESUS, '<FR>', '<Fr>')
+        if '<FU>' in converted_text:
+            converted_text = _replace_spans(converted_text, _UNDERLINE, '<FU>', '<Fu>')
 
     return converted_text
 
@@ -44,9 +237,15 @@ def convert_strong_references(text: str) -> str:
     Returns:
         str: Texto convertido
     """
-    converted_text = re.sub(r'<W([HG]\d+)>', r'<num>\1</num>', text)
-    converted_text = re.sub(r'\b([HG]\d+)\b', r'<num>\1</num>', converted_text)
-    converted_text = re.sub(r'<WT([^>]*)>', r'<tvm>\1<tvm>', converted_text)
+    converted_text = text
+
+    if '<W' in converted_text:
+        converted_text = _STRONG_TAG_PATTERN.sub(r'<num>\1</num>', converted_text)
+
+    converted_text = _STRONG_NUMBER_PATTERN.sub(r'<num>\1</num>', converted_text)
+
+    if '<WT' in converted_text:
+        converted_text = _replace_spans(converted_text, _MORPHOLOGY, '<WT', '>', single_line=False)
 
     return converted_text
 
@@ -60,7 +259,8 @@ def remove_centralization(text: str) -> str:
     Returns:
         str: Texto tratado
     """
-    text = re.sub(r'<p align=.?center.?>', '', text)
+    if '<p align=' in text:
+        text = _CENTRALIZATION_PATTERN.sub('', text)
 
     return text
 
@@ -75,8 +275,10 @@ def remove_empty_tags(text: str) -> str:
         str: Texto tratado
     """
 
-    text = re.sub(r'<h1>(\s+)?</h1>', '', text)
-    text = re.sub(r'<sup>(\s+)?</sup>', '', text)
+    if '<h1>' in text:
+        text = _EMPTY_H1_PATTERN.sub('', text)
+    if '<sup>' in text:
+        text = _EMPTY_SUP_PATTERN.sub('', text)
 
     return text
 
@@ -90,7 +292,8 @@ def get_pure_text(text: str) -> str:
     Returns:
         str: Texto tratado
     """
-    text = re.sub(r'<RF.*?<Rf>', '', text)
+    if '<RF' in text:
+        text = _replace_spans(text, _remove, '<RF', '<Rf>')
 
     return text
 
@@ -105,20 +308,36 @@ def get_commentaries(text: str) -> str:
     Returns:
         str: Comentário puro separado por tags <p><hr><p>
     """
-    text = "<p><hr><p>".join(re.findall(r"<RF.*?>(.*?)<Rf>", text))
+    text = COMMENTARY_SEPARATOR.join(get_commentary_fragments(text))
 
-    text = re.sub(r'class=.bible. ', r'', text)
-    text = re.sub(r'(href=.)#(b)', r'\1\2', text)
-    text = re.sub(r'<a href=.b([A-Z]\w+|[123][A-ZÀ-Ü]\w+) [\d:-]*.>([A-Z]\w+|[123][A-ZÀ-Ü]\w+)( [\d:\-]*)</a>',
-                  r'<ref>\2\3</ref>', text)
-    text = re.sub(
-        r'<a href=.b[\d.-]*.>([A-ZÀ-Ü]\w+|[123][A-ZÀ-Ü]\w+)( [\d:\-]*)</a>', r'<ref>\1\2</ref>', text)
-    text = re.sub(r'<a href=.b[\d.-]*.>([A-ZÀ-Ü]\w+\.|[123][A-ZÀ-Ü]\w+\.)( [\d:\-]*)</a>', r'<ref>\1\2</ref>',
-                  text)
-    text = re.sub(
-        r' ([A-ZÀ-Ü]\w+ [\d:-]+| [123][A-ZÀ-Ü]\w+ [\d:-]+)', r' <ref>\1</ref>', text)
+    return _convert_commentary_links(text)
 
-    return text
+
+def _replace_reference(match: re.Match) -> str:
+    kind = match.lastgroup
+
+    if kind == 'bare':
+        return ' <ref>' + match.group('bare') + '</ref>'
+
+    # lastgroup é o grupo dos versículos; o do livro vem logo antes
+    return '<ref>' + match.group(match.lastindex - 1) + match.group(kind) + '</ref>'
+
+
+def _replace_bare_reference(match: re.Match) -> str:
+    return ' <ref>' + match.group(1) + '</ref>'
+
+
+def _convert_commentary_links(text: str) -> str:
+    if 'class=' in text:
+        text = _BIBLE_CLASS_PATTERN.sub('', text)
+
+    if '#b' in text:
+        text = _HASH_LINK_PATTERN.sub('', text)
+
+    if '<a href=' in text:
+        return _REFERENCE_PATTERN.sub(_replace_reference, text)
+
+    return _BARE_REFERENCE_PATTERN.sub(_replace_bare_reference, text)
 
 
 def convert_bible_references(text: str) -> str:
@@ -131,26 +350,289 @@ def convert_bible_references(text: str) -> str:
         str: A referência convertida
     """
 
-    # Expressão regular para extrair as informações da referência
-    regex = r"<a href=.b(\d+)\.(\d+)\.(\d+)(?:-(\d+))?.>.*?</a>"
+    if '<a href=' not in text:
+        return text
+
+    return _replace_spans(text, _replace_bible_reference, '<a href=', '</a>',
+                          opening_pattern=_BIBLE_REFERENCE_OPENING_PATTERN)
+
+
+def _replace_bible_reference(content: str, match: re.Match) -> str:
+    book_num, chapter_num, verse_start, verse_end = match.groups()
+
+    # Converter o número do livro para a sua abreviação correspondente
+    book_abbr = _book_abbreviation(book_num)
+
+    # Formatar a referência no formato desejado
+    if verse_end:
+        return f'<ref>{book_abbr} {chapter_num}.{verse_start}-{verse_end}</ref>'
+
+    return f'<ref>{book_abbr} {chapter_num}.{verse_start}</ref>'
+
+
+def _book_abbreviation(book_num: str) -> str:
+    """Retorna a abreviação do livro pelo seu número (ex.: "43" -> "Joh")
+
+    Raises:
+        KeyError: Se o número não for de um livro conhecido
+    """
+    number = int(book_num)
+
+    if 0 < number < len(BOOK_ABBREVIATIONS) and BOOK_ABBREVIATIONS[number] and book_num[0] != '0':
+        return BOOK_ABBREVIATIONS[number]
+
+    raise KeyError(book_num)
+
+
+def convert_verse(text: str) -> str:
+    """Aplica ao versículo de uma bíblia comum toda a cadeia de conversão
+    para o padrão e-Sword HD, na mesma ordem usada pelo conversor
+
+    Args:
+        text (str): Texto do versículo no padrão MySword
+
+    Returns:
+        str: Texto do versículo no padrão e-Sword HD
+    """
+    if '<' not in text:
+        return _STRONG_NUMBER_PATTERN.sub(r'<num>\1</num>', text)
+
+    text = convert_tags(text)
+    text = remove_centralization(text)
+    text = convert_strong_references(text)
+    text = remove_empty_tags(text)
+
+    return text
+
+
+def extract_verse_text(text: str) -> str:
+    """Extrai o texto puro do versículo de uma bíblia de estudos (sem os
+    comentários) e o converte para o padrão e-Sword HD
+
+    Args:
+        text (str): Texto do versículo no padrão MySword
+
+    Returns:
+        str: Texto do versículo no padrão e-Sword HD
+    """
+    if '<' not in text:
+        return _STRONG_NUMBER_PATTERN.sub(r'<num>\1</num>', text)
+
+    text = get_pure_text(text)
+    text = remove_centralization(text)
+    text = convert_tags(text)
+    text = convert_strong_references(text)
+    text = remove_empty_tags(text)
+
+    return text
+
+
+def get_commentary_fragments(text: str) -> list[str]:
+    """Retorna o conteúdo de cada comentário (<RF><Rf>) do versículo, sem conversão
+
+    Args:
+        text (str): Texto do versículo no padrão MySword
+
+    Returns:
+        list[str]: O conteúdo de cada comentário
+    """
+    return [text[content_start:content_end]
+            for _, content_start, content_end, _ in _find_spans(text, '<RF', '<Rf>', opening_end='>')]
+
+
+def convert_commentary_fragment(fragment: str) -> str:
+    """Converte o conteúdo de um único comentário (<RF><Rf>) para o padrão e-Sword HD
+
+    Args:
+        fragment (str): Conteúdo do comentário
+
+    Returns:
+        str: Comentário convertido
+    """
+    text = _convert_commentary_links(fragment)
+    text = convert_strong_references(text)
+    text = convert_bible_references(text)
+
+    return text
+
+
+def _is_self_contained(fragment: str) -> bool:
+    """Checa se o comentário pode ser convertido isoladamente, ou seja, se não
+    termina com uma tag ou um link aberto que, no texto unido, seria fechado
+    dentro do separador ou do comentário seguinte"""
+    return fragment.rfind('<') <= fragment.rfind('>') and fragment.rfind('<a') <= fragment.rfind('</a>')
+
+
+def extract_verse_commentary(text: str, convert_fragment: Callable[[str], str] = convert_commentary_fragment) -> Optional[str]:
+    """Extrai e converte os comentários (<RF><Rf>) do versículo de uma
+    bíblia de estudos
+
+    Cada comentário é convertido separadamente por `convert_fragment`, o que
+    permite reaproveitar a conversão de comentários repetidos entre versículos
+
+    Args:
+        text (str): Texto do versículo no padrão MySword
+        convert_fragment (Callable[[str], str]): Conversão de um único comentário
+
+    Returns:
+        Optional[str]: Comentário no padrão e-Sword HD ou None se o versículo
+        não tiver comentários
+    """
+    if '<RF' not in text:
+        return None
+
+    fragments = get_commentary_fragments(text)
+
+    if all(_is_self_contained(fragment) for fragment in fragments):
+        return COMMENTARY_SEPARATOR.join(map(convert_fragment, fragments))
+
+    text = _convert_commentary_links(COMMENTARY_SEPARATOR.join(fragments))
+    text = convert_strong_references(text)
+    text = convert_bible_references(text)
+
+    return text
+
+
+def convert_commentary_text(text: str) -> str:
+    """Converte o HTML de um registro de um comentário MySword para o padrão
+    e-Sword HD (links de referências bíblicas, centralização e tags vazias)
+
+    Args:
+        text (str): HTML do comentário no padrão MySword
+
+    Returns:
+        str: HTML do comentário no padrão e-Sword HD
+    """
+    if '<' not in text:
+        return text
+
+    if 'class=' in text:
+        text = _BIBLE_CLASS_PATTERN.sub(r'', text)
+
+    if '#b' in text:
+        text = _HASH_LINK_PATTERN.sub('', text)
+
+    text = convert_bible_references(text)
+    text = remove_centralization(text)
+    text = remove_empty_tags(text)
+
+    return text
+
+
+def _substitute_until_stable(pattern: re.Pattern, replacement, text: str) -> str:
+    """Aplica a substituição até o texto parar de mudar (ex.: tags vazias aninhadas)"""
+    while True:
+        text, count = pattern.subn(replacement, text)
+
+        if not count:
+            return text
+
+
+def _remove_empty_inline_tags(text: str) -> str:
+    """Remove as tags de formatação vazias (ex.: <i></i>), inclusive as que só
+    ficam vazias quando as de dentro são removidas, numa única passada"""
+    pieces: list[str] = []
+
+    for token in _MARKUP_TOKEN_PATTERN.findall(text):
+        if token.startswith('</') and pieces:
+            opening = _INLINE_OPENING_PATTERN.fullmatch(pieces[-1])
+
+            if opening is not None and token == '</' + opening.group(1) + '>':
+                pieces.pop()
+                continue
+
+        pieces.append(token)
+
+    return ''.join(pieces)
+
+
+def _merge_adjacent_fonts(match: re.Match) -> str:
+    return match.group(1) + match.group(2) + match.group(3)
+
+
+def _remove_italic_break(match: re.Match) -> str:
+    return match.group(1)
+
+
+def minify_markup(text: str) -> str:
+    """Reduz o HTML já convertido sem mudar a sua aparência: remove tags de
+    formatação vazias, junta trechos vizinhos com a mesma formatação
+    (ex.: dois <font color="#gray"><i> separados só por espaço), junta
+    parágrafos vazios seguidos e espaços repetidos.
+    Quebras de linha (<br>) são mantidas, pois cada uma aparece no texto
+
+    Args:
+        text (str): HTML no padrão e-Sword HD
+
+    Returns:
+        str: O mesmo HTML, menor
+    """
+    if '  ' in text or '\t' in text:
+        text = _SPACE_RUN_PATTERN.sub(' ', text)
+
+    if '<' not in text:
+        return text
+
+    if '></' in text:
+        text = _remove_empty_inline_tags(text)
+
+    if '<font ' in text:
+        text = _substitute_until_stable(_ADJACENT_FONT_PATTERN, _merge_adjacent_fonts, text)
+
+    if '</i>' in text:
+        text = _ADJACENT_ITALIC_PATTERN.sub(_remove_italic_break, text)
+
+    if '<p>' in text:
+        text = _EMPTY_PARAGRAPH_PATTERN.sub('', text)
+        text = _PARAGRAPH_RUN_PATTERN.sub('<p>', text)
+
+    return text
+
+
+def find_malformed_tags(text: str) -> list[MalformedTag]:
+    """Verifica, em tempo linear, se as tags de abertura e fechamento da MySword
+    (<TS><Ts>, <RF><Rf>, <FI><Fi>, <FO><Fo>, <FR><Fr> e <FU><Fu>) do texto
+    formam pares, usando uma pilha das tags abertas
+
+    Args:
+        text (str): Texto no padrão MySword
+
+    Returns:
+        list[MalformedTag]: As tags sem par, na ordem em que aparecem (vazia se o texto estiver correto)
+    """
+    problems: list[MalformedTag] = []
+
+    if '<' not in text:
+        return problems
+
+    stack: list[tuple[int, str, str]] = []
+    open_tags: dict[str, int] = {}
+
+    for match in _MYSWORD_TAG_PATTERN.finditer(text):
+        opening, closing = match.groups()
+
+        if opening is not None:
+            # <TS2> é fechada por <Ts>, <RF q=a> por <Rf>
+            expected = opening[0] + opening[1].lower()
+            stack.append((match.start(), match.group(0), expected))
+            open_tags[expected] = open_tags.get(expected, 0) + 1
+            continue
 
-    def replace_references(match):
-        book_num = match.group(1)
-        chapter_num = match.group(2)
-        verse_start = match.group(3)
-        verse_end = match.group(4)
+        if not open_tags.get(closing):
+            problems.append(MalformedTag(match.start(), match.group(0), "foi fechada sem ter sido aberta"))
+            continue
 
-        # Converter o número do livro para a sua abreviação correspondente
-        book_abbr = ABBREVIATIONS[str(book_num)]
+        # As tags abertas depois da que está sendo fechada não foram fechadas
+        while True:
+            position, tag, expected = stack.pop()
+            open_tags[expected] -= 1
 
-        # Formatar a referência no formato desejado
-        if verse_end:
-            reference = f'{book_abbr} {chapter_num}.{verse_start}-{verse_end}'
-        else:
-            reference = f'{book_abbr} {chapter_num}.{verse_start}'
+            if expected == closing:
+                break
 
-        # Retornar a referência formatada
+            problems.append(MalformedTag(position, tag, "não foi fechada"))
 
-        return rf'<ref>{reference}</ref>'
+    problems.extend(MalformedTag(position, tag, "não foi fechada") for position, tag, _ in stack)
+    problems.sort()
 
-    return re.sub(regex, replace_references, text)
+    return problems